@@ -0,0 +1,82 @@
+"""
+Application-level registry of the LLM model and its CodeAgents.
+
+The model and a small pool of agents per role are built once at startup.
+Requests check an agent out, run it with a fresh memory (reset=True) and
+hand it back, so agent construction never sits on the request path. LiteLLM
+is given shared httpx clients so connections to the LLM backend are pooled
+across concurrent requests.
+"""
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import config
+
+
+def configure_http_pool(max_connections: int = config.LLM_MAX_CONNECTIONS):
+    """Points LiteLLM at shared, keep-alive httpx clients instead of a client per call."""
+    import httpx
+    import litellm
+
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    litellm.client_session = httpx.Client(limits=limits, timeout=config.LLM_TIMEOUT)
+    litellm.aclient_session = httpx.AsyncClient(limits=limits, timeout=config.LLM_TIMEOUT)
+
+
+def build_model():
+    from smolagents import LiteLLMModel
+    return LiteLLMModel(model_id=config.LLM_MODEL_ID, api_key=os.getenv("GEMINI_API_KEY"), temperature=0.1)
+
+
+class AgentRegistry:
+    def __init__(self, specs: Dict[str, dict], model=None, pool_size: int = config.AGENT_POOL_SIZE):
+        """
+        Args:
+            specs: Maps a role to the CodeAgent keyword arguments (tools, name, description).
+            model: The shared model; a LiteLLMModel for config.LLM_MODEL_ID if omitted.
+            pool_size: Agents per role, i.e. how many requests can run that role at once.
+        """
+        self.model = model if model is not None else build_model()
+        self.specs = specs
+        self._pools = {}
+        for role, spec in specs.items():
+            pool = queue.Queue()
+            for _ in range(pool_size):
+                pool.put(self._build(spec))
+            self._pools[role] = pool
+
+    def _build(self, spec: dict):
+        from smolagents import CodeAgent
+        return CodeAgent(model=self.model, **spec)
+
+    @contextmanager
+    def checkout(self, role: str):
+        """Borrows an agent for one request; blocks while every agent of this role is busy."""
+        agent = self._pools[role].get()
+        try:
+            yield agent
+        finally:
+            self._pools[role].put(agent)
+
+
+_registry: Optional[AgentRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def init_registry(specs: Dict[str, dict], model=None, pool_size: int = config.AGENT_POOL_SIZE) -> AgentRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            if model is None:
+                configure_http_pool()
+            _registry = AgentRegistry(specs, model=model, pool_size=pool_size)
+    return _registry
+
+
+def get_registry() -> AgentRegistry:
+    if _registry is None:
+        raise RuntimeError("Agent registry has not been initialised; call init_registry() at startup")
+    return _registry
@@ -1,8 +1,22 @@
 import streamlit as st
 import requests
 import os
+import json
 import tempfile
 
+def iter_events(response):
+    """Yields (event, data) pairs from a text/event-stream response."""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+        elif not line and data:
+            yield event, json.loads("\n".join(data))
+            event, data = "message", []
+
+
 st.set_page_config(page_title="Medicine Error Detection Companion", page_icon="🏥", layout="wide")
 
 st.title("Medicine Error Detection Companion")
@@ -70,23 +84,34 @@ if submit_button:
                     file_content = f.read()
                     files_to_upload.append(("files", (uploaded_file.name, file_content)))
             
-            # Send request to API
-            url = "http://127.0.0.1:8000/process-patient-data/"
-            response = requests.post(url, data=payload, files=files_to_upload)
+            # Send request to the streaming API and render each stage as it completes
+            url = "http://127.0.0.1:8000/process-patient-data/stream"
+            response = requests.post(url, data=payload, files=files_to_upload, stream=True)
             
-            # Display the response
             if response.status_code == 200:
-                st.success("Analysis completed successfully!")
-                
-                # Display the response in a nicely formatted way
-                st.markdown("## Health Insights")
-                markdown_text = st.markdown(response.text, unsafe_allow_html=True)
-                
-    # Ensure proper line breaks for Markdown
-                st.markdown(markdown_text) 
+                progress = st.status("Analysing your medications...", expanded=True)
+                for event, data in iter_events(response):
+                    if event == "drugs":
+                        progress.write("**Medications found:** " + (", ".join(data) or "none"))
+                    elif event == "smiles":
+                        unresolved = [drug for drug, smiles in data.items() if not smiles]
+                        progress.write(f"**Chemical structures resolved:** {len(data) - len(unresolved)} of {len(data)}")
+                    elif event == "interactions":
+                        progress.write(f"**Known interacting pairs:** {len(data)}")
+                        for pair in data:
+                            progress.write(f"- {' + '.join(pair['drugs'])}: {', '.join(pair['side_effects'][:10])}")
+                    elif event == "summary":
+                        # Display the response in a nicely formatted way
+                        st.markdown("## Health Insights")
+                        st.markdown(data if isinstance(data, str) else json.dumps(data, indent=2), unsafe_allow_html=True)
+                    elif event == "error":
+                        progress.update(label="Analysis failed", state="error")
+                        st.error(f"Error: {data['status']} {data['error']}")
+                    elif event == "done":
+                        progress.update(label="Analysis completed successfully!", state="complete", expanded=False)
             else:
                 st.error(f"Error: {response.status_code}")
-                st.text(response.text, height=300)
+                st.text(response.text)
                 
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
@@ -0,0 +1,361 @@
+"""
+Batch analysis of JSONL patient records.
+
+Each input line is one patient: the fields of the /process-patient-data/ form,
+plus an optional "id", "document_text" (already extracted text) and, from the
+command line only, "documents" (paths to PDF/DOCX files). Records are
+analysed in chunks, and work shared across a chunk is done once: identical
+documents are parsed once (by SHA-256), identical requests share one answer
+(the response cache fingerprint), every distinct drug is resolved in one
+resolve_many() call and every distinct pair is looked up in one query. Drug
+extraction and summaries run on a bounded thread pool.
+
+Results are appended to the output JSONL in input order. After every chunk a
+checkpoint next to the output records how many input records are done and the
+output size at that point, so an interrupted run resumes where it stopped:
+
+    python batch.py patients.jsonl results.jsonl --concurrency 8
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import config
+import pipeline
+from document_cache import get_document_cache
+from document_text import extract_pdf_text, extract_word_text
+from interaction_store import get_default_store
+from pubchem_resolver import resolve_many
+from response_cache import MISS, fingerprint, get_response_cache
+
+# submit() names batches after the first 16 hex digits of the SHA-256 of their input
+BATCH_ID = re.compile(r"[0-9a-f]{16}")
+
+PATIENT_FIELDS = ("age", "sex", "height", "weight", "allergies", "preexisting_conditions", "medications",
+                  "family_history", "question")
+
+
+class BatchError(Exception):
+    pass
+
+
+class PrefetchedInteractions:
+    """
+    The lookup_pairs/side_effect_names interface over results fetched once for a whole chunk.
+    Pairs that were not prefetched (e.g. those of structural analogues) go to the fallback store.
+    """
+
+    def __init__(self, interactions: Dict[Tuple[str, str], List[int]], labels: Dict[int, str], fallback=None):
+        self.interactions = interactions
+        self.labels = labels
+        self.fallback = fallback
+
+    def lookup_pairs(self, pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], List[int]]:
+        pairs = list(dict.fromkeys(tuple(p) for p in pairs))
+        missing = [pair for pair in pairs if pair not in self.interactions]
+        fetched = self.fallback.lookup_pairs(missing) if self.fallback and missing else {}
+        return {pair: self.interactions[pair] if pair in self.interactions else fetched.get(pair, []) for pair in pairs}
+
+    def side_effect_names(self, ids: Iterable[int]) -> Dict[int, str]:
+        ids = list(dict.fromkeys(ids))
+        names = {i: self.labels[i] for i in ids if i in self.labels}
+        missing = [i for i in ids if i not in names]
+        if self.fallback and missing:
+            names.update(self.fallback.side_effect_names(missing))
+        return names
+
+
+class BatchRunner:
+    def __init__(self, concurrency: int = config.BATCH_CONCURRENCY, chunk_size: int = config.BATCH_CHUNK_SIZE,
+                 allow_paths: bool = False):
+        """
+        Args:
+            concurrency: Records whose LLM stages run at once.
+            chunk_size: Records analysed together; shared lookups are batched per chunk.
+            allow_paths: Whether records may name document files to read (never for HTTP uploads).
+        """
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.allow_paths = allow_paths
+        self._documents: Dict[str, str] = {}  # SHA-256 -> text, for this run
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+
+    def close(self):
+        self._executor.shutdown()
+
+    def document_text(self, path: str) -> Tuple[str, str]:
+        """Text and SHA-256 of a document file; each distinct file is parsed once per run."""
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        text = self._documents.get(digest)
+        if text is None:
+            text = get_document_cache().get(digest)
+            if text is None:
+                if path.endswith(".pdf"):
+                    text = extract_pdf_text(data)
+                elif path.endswith(".docx"):
+                    text = extract_word_text(data)
+                else:
+                    raise BatchError(f"Unsupported file type: {path}")
+                get_document_cache().put(digest, text)
+            self._documents[digest] = text
+        return text, digest
+
+    def prepare(self, record: dict) -> dict:
+        """Validates a record and attaches its document text and response cache key."""
+        from patient_help_api import Patient
+
+        fields = {name: record.get(name, "") for name in PATIENT_FIELDS}
+        texts = [record.get("document_text") or ""]
+        digests = [hashlib.sha256(texts[0].encode("utf-8")).hexdigest()] if texts[0] else []
+        paths = record.get("documents") or []
+        if paths and not self.allow_paths:
+            raise BatchError("Document paths are only accepted from the command line")
+        for path in paths:
+            text, digest = self.document_text(path)
+            texts.append(text)
+            digests.append(digest)
+        combined_texts = "\n".join(t for t in texts if t)
+        patient = Patient(**fields, user_document_data=combined_texts)
+        return {
+            "patient": patient,
+            "documents": combined_texts,
+            "key": fingerprint(fields["medications"], fields["allergies"], fields["preexisting_conditions"],
+                               fields["question"], digests, prompt_version=pipeline.PROMPT_VERSION),
+        }
+
+    def extract(self, job: dict) -> List[str]:
+        from context_retrieval import select_relevant_context
+
+        patient = job["patient"]
+        relevant_texts = select_relevant_context(job["documents"], " ".join([patient.question, patient.medications,
+                                                                              patient.allergies, patient.preexisting_conditions]))
+        context = patient.copy(update={"user_document_data": relevant_texts}).dict(exclude={"question"})
+        return pipeline.extract_drug_list(context, patient.question, patient.medications, job["documents"]) or []
+
+    def run_chunk(self, records: List[Tuple[str, dict]]) -> List[dict]:
+        """Analyses (id, record) pairs and returns one result per record, in order."""
+        results: List[Optional[dict]] = [None] * len(records)
+        jobs: Dict[str, dict] = {}  # response key -> shared work for every record with that key
+        members: Dict[str, List[int]] = {}
+        for i, (record_id, record) in enumerate(records):
+            try:
+                job = self.prepare(record)
+            except Exception as e:
+                results[i] = {"id": record_id, "error": str(e)}
+                continue
+            jobs.setdefault(job["key"], job)
+            members.setdefault(job["key"], []).append(i)
+
+        response_cache = get_response_cache()
+        pending = {}
+        for key, job in jobs.items():
+            cached = response_cache.get(key)
+            if cached is not MISS:
+                job.update(summary=cached, cached=True)
+            else:
+                pending[key] = job
+
+        # Drug extraction per distinct request, then one resolution and one pair lookup for the whole chunk
+        for key, outcome in zip(pending, self._executor.map(self._attempt, [self.extract] * len(pending), pending.values())):
+            pending[key]["drugs"], pending[key]["error"] = outcome
+        extracted = {key: job for key, job in pending.items() if job["error"] is None and job["drugs"]}
+        resolved = resolve_many(sorted({drug for job in extracted.values() for drug in job["drugs"]}))
+        pairs = set()
+        for job in extracted.values():
+            smiles = dict.fromkeys(s for s in (resolved.get(drug) for drug in job["drugs"]) if s)
+            pairs.update(itertools.combinations(smiles, 2))
+        store = get_default_store()
+        interactions = store.lookup_pairs(pairs)
+        prefetched = PrefetchedInteractions(interactions, store.side_effect_names(
+            y for side_effects in interactions.values() for y in side_effects), fallback=store)
+        for job in extracted.values():
+            job["interactions"] = pipeline.lookup_interactions(
+                {drug: resolved.get(drug) for drug in job["drugs"]}, store=prefetched)
+
+        for key, outcome in zip(extracted, self._executor.map(
+                self._attempt, [pipeline.summarize] * len(extracted),
+                [job["interactions"] for job in extracted.values()], [job["drugs"] for job in extracted.values()])):
+            extracted[key]["summary"], extracted[key]["error"] = outcome
+            if outcome[1] is None and outcome[0] is not None:
+                response_cache.put(key, outcome[0])
+
+        for key, job in jobs.items():
+            for i in members[key]:
+                record_id = records[i][0]
+                if job.get("error"):
+                    results[i] = {"id": record_id, "error": job["error"]}
+                else:
+                    results[i] = {"id": record_id, "drugs": job.get("drugs"), "interactions": job.get("interactions"),
+                                  "summary": job.get("summary"), "cached": job.get("cached", False)}
+        return results
+
+    @staticmethod
+    def _attempt(fn, *args):
+        try:
+            return fn(*args), None
+        except Exception as e:
+            return None, str(e)
+
+    def run(self, input_path: str, output_path: str, progress=None) -> dict:
+        """
+        Analyses every record of input_path into output_path, resuming from its checkpoint.
+
+        Args:
+            progress: Optional callable given the checkpoint dict after every chunk.
+        """
+        checkpoint_path = f"{output_path}.checkpoint"
+        checkpoint = {"records": 0, "output_bytes": 0, "errors": 0}
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                checkpoint = json.load(f)
+        # Anything written after the last checkpoint is redone
+        with open(output_path, "ab") as out:
+            out.truncate(checkpoint["output_bytes"])
+
+        with open(input_path, encoding="utf-8") as f, open(output_path, "a", encoding="utf-8") as out:
+            records = ((n, line) for n, line in enumerate(f) if line.strip())
+            records = itertools.islice(records, checkpoint["records"], None)
+            while True:
+                chunk = []
+                for n, line in itertools.islice(records, self.chunk_size):
+                    try:
+                        record = json.loads(line)
+                    except ValueError as e:
+                        chunk.append((str(n), {"_error": f"Invalid JSON: {e}"}))
+                        continue
+                    if not isinstance(record, dict):
+                        chunk.append((str(n), {"_error": f"Expected a JSON object, got {type(record).__name__}"}))
+                        continue
+                    chunk.append((str(record.get("id", n)), record))
+                if not chunk:
+                    break
+                valid = [(i, r) for i, r in chunk if "_error" not in r]
+                results = iter(self.run_chunk(valid))
+                for record_id, record in chunk:
+                    result = {"id": record_id, "error": record["_error"]} if "_error" in record else next(results)
+                    checkpoint["errors"] += "error" in result
+                    out.write(json.dumps(result) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+                checkpoint["records"] += len(chunk)
+                checkpoint["output_bytes"] = out.tell()
+                tmp_path = f"{checkpoint_path}.tmp"
+                with open(tmp_path, "w") as cp:
+                    json.dump(checkpoint, cp)
+                os.replace(tmp_path, checkpoint_path)
+                if progress:
+                    progress(dict(checkpoint))
+        return checkpoint
+
+
+class BatchManager:
+    """Batches submitted over HTTP, each run on its own background thread."""
+
+    def __init__(self, directory: str = config.BATCH_DIR):
+        self.directory = directory
+        self._states: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def paths(self, batch_id: str) -> Tuple[str, str]:
+        return os.path.join(self.directory, f"{batch_id}.input.jsonl"), os.path.join(self.directory, f"{batch_id}.results.jsonl")
+
+    def submit(self, data: bytes) -> str:
+        batch_id = hashlib.sha256(data).hexdigest()[:16]
+        input_path, output_path = self.paths(batch_id)
+        with self._lock:
+            if self._states.get(batch_id, {}).get("state") == "running":
+                return batch_id
+            total = sum(1 for line in data.splitlines() if line.strip())
+            self._states[batch_id] = {"state": "running", "records": 0, "total": total, "errors": 0}
+        with open(input_path, "wb") as f:
+            f.write(data)
+        threading.Thread(target=self._run, args=(batch_id, input_path, output_path), name=f"batch-{batch_id}", daemon=True).start()
+        return batch_id
+
+    def _update(self, batch_id: str, **changes):
+        with self._lock:
+            self._states[batch_id].update(changes)
+
+    def _run(self, batch_id: str, input_path: str, output_path: str):
+        runner = BatchRunner()
+        try:
+            checkpoint = runner.run(input_path, output_path,
+                                    progress=lambda cp: self._update(batch_id, records=cp["records"], errors=cp["errors"]))
+            self._update(batch_id, state="done", records=checkpoint["records"], errors=checkpoint["errors"])
+        except Exception as e:
+            self._update(batch_id, state="failed", error=str(e))
+        finally:
+            runner.close()
+
+    def status(self, batch_id: str) -> Optional[dict]:
+        with self._lock:
+            state = self._states.get(batch_id)
+            if state is None:
+                state = self._recover(batch_id)
+                if state is not None:
+                    self._states[batch_id] = state
+            return dict(state, batch_id=batch_id) if state else None
+
+    def _recover(self, batch_id: str) -> Optional[dict]:
+        """
+        The state of a batch submitted before a restart, rebuilt from its input and checkpoint.
+        A batch that stopped part-way is "interrupted"; submitting the same file again resumes it.
+        """
+        if not BATCH_ID.fullmatch(batch_id):
+            return None
+        input_path, output_path = self.paths(batch_id)
+        if not os.path.exists(input_path):
+            return None
+        with open(input_path, "rb") as f:
+            total = sum(1 for line in f if line.strip())
+        checkpoint = {"records": 0, "errors": 0}
+        try:
+            with open(f"{output_path}.checkpoint") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            pass
+        return {"state": "done" if checkpoint["records"] >= total else "interrupted",
+                "records": checkpoint["records"], "total": total, "errors": checkpoint["errors"]}
+
+
+_manager: Optional[BatchManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_batch_manager() -> BatchManager:
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = BatchManager()
+    return _manager
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file with one patient record per line")
+    parser.add_argument("output", help="JSONL file the results are appended to")
+    parser.add_argument("--concurrency", type=int, default=config.BATCH_CONCURRENCY)
+    parser.add_argument("--chunk-size", type=int, default=config.BATCH_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    import patient_help_api
+    from agent_registry import init_registry
+
+    init_registry(patient_help_api.agent_specs())
+    runner = BatchRunner(concurrency=args.concurrency, chunk_size=args.chunk_size, allow_paths=True)
+    try:
+        done = runner.run(args.input, args.output,
+                          progress=lambda cp: print(f"{cp['records']} records done, {cp['errors']} errors", flush=True))
+    finally:
+        runner.close()
+    print(f"Wrote {done['records']} results to {args.output}")
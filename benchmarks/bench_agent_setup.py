@@ -0,0 +1,57 @@
+"""
+Per-request agent setup overhead: building the model and the CodeAgents on
+every request (the old process_patient_data) versus checking them out of the
+startup-time AgentRegistry. The LLM itself is a stub and is never called.
+
+    python -m benchmarks.bench_agent_setup --requests 200
+"""
+import argparse
+import statistics
+import time
+
+from agent_registry import AgentRegistry
+from benchmarks.stub_llm import StubModel
+
+
+def agent_specs():
+    from patient_help_api import agent_specs
+    return agent_specs()
+
+
+def per_request_build(specs):
+    from smolagents import CodeAgent
+    model = StubModel()
+    return [CodeAgent(model=model, **spec) for spec in specs.values()]
+
+
+def per_request_checkout(registry, specs):
+    for role in specs:
+        with registry.checkout(role):
+            pass
+
+
+def timed(fn, n):
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, max(samples) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    specs = agent_specs()
+    before = timed(lambda: per_request_build(specs), args.requests)
+    start = time.perf_counter()
+    registry = AgentRegistry(specs, model=StubModel(), pool_size=4)
+    startup_ms = (time.perf_counter() - start) * 1000
+    after = timed(lambda: per_request_checkout(registry, specs), args.requests)
+
+    print(f"{'':>22} {'p50 (ms)':>9} {'max (ms)':>9}")
+    print(f"{'build per request':>22} {before[0]:>9.3f} {before[1]:>9.3f}")
+    print(f"{'registry checkout':>22} {after[0]:>9.3f} {after[1]:>9.3f}")
+    print(f"one-off registry startup: {startup_ms:.1f} ms")
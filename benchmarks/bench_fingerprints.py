@@ -0,0 +1,79 @@
+"""
+Featurization time and peak memory: new.ipynb's per-row fingerprints (one
+int8 array per Drug1 and Drug2 of every row, made into one dense matrix)
+versus the fingerprint store (each distinct SMILES fingerprinted once on a
+process pool, packed, and unpacked one batch of pair ids at a time). Both
+produce the predictor's feature, the sum of the two 2048-bit fingerprints,
+so the comparison isolates how the fingerprints are computed and stored.
+
+    python -m benchmarks.bench_fingerprints --drugs 600 --rows 200000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.fixtures import build_compact_db, synthetic_rows, synthetic_smiles
+from fingerprint_store import N_BITS, FingerprintStore, morgan_fingerprint
+
+
+def per_row(rows):
+    """The notebook: fingerprint both drugs of every row, then one dense (rows, n_bits) matrix of their sums."""
+    zeros = np.zeros(N_BITS, dtype=np.int8)
+    fp1 = [morgan_fingerprint(a) for a, _, _ in rows]
+    fp2 = [morgan_fingerprint(b) for _, b, _ in rows]
+    fp1 = [zeros if fp is None else fp for fp in fp1]
+    fp2 = [zeros if fp is None else fp for fp in fp2]
+    features = np.stack(fp1).astype(np.float32)
+    features += np.stack(fp2)
+    return features
+
+
+def with_store(db_path: str, store_path: str, processes: int, batch_size: int):
+    FingerprintStore.from_db(db_path, processes=processes).save(store_path)
+    store = FingerprintStore.load(store_path)
+    a, b, y = store.training_pairs(db_path)
+    n = 0
+    for features, labels in store.batches(a, b, y, batch_size=batch_size):
+        n += len(features)
+    return n
+
+
+def profiled(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drugs", type=int, default=600)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--per-row-rows", type=int, default=20_000,
+                        help="Rows featurized the notebook's way; its time and memory grow linearly with rows")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=4096)
+    args = parser.parse_args()
+
+    drugs = synthetic_smiles(args.drugs)
+    rows = synthetic_rows(drugs, args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "raman.db")
+        build_compact_db(db_path, rows)
+        sample = rows[:args.per_row_rows]
+        before = profiled(per_row, sample)
+        after = profiled(with_store, db_path, os.path.join(tmp, "raman.fingerprints"), args.processes, args.batch_size)
+
+    scale = args.rows / len(sample)
+    print(f"{'':>22} {'rows':>9} {'time (s)':>9} {'peak (MB)':>10}")
+    print(f"{'per row (notebook)':>22} {len(sample):>9} {before[0]:>9.2f} {before[1] / 1e6:>10.1f}")
+    print(f"{'  extrapolated':>22} {args.rows:>9} {before[0] * scale:>9.2f} {before[1] * scale / 1e6:>10.1f}")
+    print(f"{'fingerprint store':>22} {args.rows:>9} {after[0]:>9.2f} {after[1] / 1e6:>10.1f}")
+    print("peak memory of the store run counts the parent process only; pool processes are not traced")
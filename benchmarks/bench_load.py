@@ -0,0 +1,99 @@
+"""
+Load test of /process-patient-data/ against a stub LLM.
+
+Drives the FastAPI app in-process through httpx's ASGI transport at several
+client concurrencies and reports requests per second and latency. With the
+pipeline running off the event loop, throughput should grow with concurrency
+until ANALYSIS_WORKERS or MAX_IN_FLIGHT_ANALYSES is reached.
+
+Runs offline against the same fixtures as benchmarks.suite: a synthetic
+interaction database, FakePubChem and the response cache switched off. Every
+request lists a different sample of drugs, so each one is a full analysis.
+
+    python -m benchmarks.bench_load --latency 0.1 --concurrency 1 8 32
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_pubchem import FakePubChem
+from benchmarks.suite import prepare
+
+
+def payloads(names, seed: int):
+    """Endless form payloads, each with its own sample of four drug names."""
+    rng = random.Random(seed)
+    while True:
+        yield {
+            "age": str(rng.randint(18, 90)),
+            "sex": rng.choice(["Male", "Female"]),
+            "height": "175",
+            "weight": "85",
+            "allergies": "Shellfish, Dust",
+            "preexisting_conditions": "Diabetes, Hypertension",
+            "medications": ", ".join(name for name, _ in rng.sample(names, 4)),
+            "family_history": "Heart Disease",
+            "question": "I feel dizzy after taking my medication. What could be wrong?",
+        }
+
+
+async def run_level(app, concurrency: int, requests_per_client: int, forms):
+    latencies = []
+    statuses = {}
+
+    async def client_loop(client):
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            response = await client.post("/process-patient-data/", data=next(forms))
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000,
+        "statuses": statuses,
+    }
+
+
+def setup_app(latency: float):
+    import patient_help_api
+    from benchmarks.stub_llm import StubModel
+
+    patient_help_api.warm_up(model=StubModel(latency=latency))
+    return patient_help_api.app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.1, help="Stub LLM latency per call in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests-per-client", type=int, default=4)
+    parser.add_argument("--pubchem-latency", type=float, default=0.05, help="Fake PubChem latency per lookup in seconds")
+    parser.add_argument("--drugs", type=int, default=600, help="Drugs in the synthetic interaction database")
+    parser.add_argument("--rows", type=int, default=200000, help="Interaction rows in the synthetic database")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    args.suites = ["endpoint"]
+
+    with FakePubChem(latency=args.pubchem_latency) as fake, tempfile.TemporaryDirectory() as tmp:
+        data = prepare(args, tmp, fake.base_url)
+        app = setup_app(args.latency)
+        forms = payloads(data["names"], args.seed)
+        print(f"{'clients':>8} {'requests':>9} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9}  statuses")
+        for level in args.concurrency:
+            r = asyncio.run(run_level(app, level, args.requests_per_client, forms))
+            print(f"{r['concurrency']:>8} {r['requests']:>9} {r['rps']:>8.2f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f}  {r['statuses']}")
@@ -0,0 +1,68 @@
+"""
+PDF text extraction throughput and peak memory on synthetic multi-hundred-page PDFs.
+
+Compares the old page-by-page string concatenation from a temp file with
+document_text.extract_pdf_text from the in-memory buffer, serial and on the
+process pool. Each run happens in a fresh process so peak RSS is per method.
+
+    python -m benchmarks.bench_pdf --pages 100 300 600
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.fixtures import synthetic_pdf
+
+
+def old_extract(path: str) -> str:
+    import fitz
+    pdf_document = fitz.open(path)
+    all_text = ""
+    for page in pdf_document:
+        all_text += page.get_text() + "\n"
+    pdf_document.close()
+    return all_text.strip()
+
+
+def _run(method: str, data: bytes, queue):
+    from document_text import extract_pdf_text, shutdown_pdf_pool
+    start = time.perf_counter()
+    if method == "old (temp file, +=)":
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(data)
+        text = old_extract(f.name)
+        os.remove(f.name)
+    elif method == "buffer, serial":
+        text = extract_pdf_text(data, parallel_min_pages=10 ** 9)
+    else:
+        text = extract_pdf_text(data, parallel_min_pages=1)
+    elapsed = time.perf_counter() - start
+    shutdown_pdf_pool()
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    queue.put((elapsed, rss_kb / 1024, len(text)))
+
+
+def measure(method: str, data: bytes):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run, args=(method, data, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 300, 600])
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} {'method':>22} {'pages/s':>9} {'peak RSS (MB)':>14} {'chars':>10}")
+    for n_pages in args.pages:
+        data = synthetic_pdf(n_pages)
+        for method in ("old (temp file, +=)", "buffer, serial", "buffer, process pool"):
+            elapsed, rss_mb, chars = measure(method, data)
+            print(f"{n_pages:>6} {method:>22} {n_pages / elapsed:>9.1f} {rss_mb:>14.1f} {chars:>10}")
@@ -0,0 +1,55 @@
+"""
+Wall time of drug name -> SMILES resolution versus the number of drugs.
+
+Compares the old one-at-a-time loop with PubChemResolver.resolve_many against a
+local fake PubChem, with a cold cache for every measurement.
+
+    python -m benchmarks.bench_resolver --latency 0.2 --sizes 1 2 4 8 16
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.fake_pubchem import FakePubChem
+from drug_cache import SmilesCache
+from pubchem_resolver import PubChemResolver
+
+
+def run(sizes, latency: float, workers: int):
+    rows = []
+    with FakePubChem(latency=latency) as fake, tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            names = [f"drug-{n}-{i}" for i in range(n)]
+
+            cache = SmilesCache(path=os.path.join(tmp, f"seq-{n}.db"))
+            resolver = PubChemResolver(base_url=fake.base_url, max_workers=workers, cache=cache)
+            start = time.perf_counter()
+            for name in names:
+                resolver.resolve_many([name])
+            sequential = time.perf_counter() - start
+
+            cache = SmilesCache(path=os.path.join(tmp, f"batch-{n}.db"))
+            resolver = PubChemResolver(base_url=fake.base_url, max_workers=workers, cache=cache)
+            start = time.perf_counter()
+            resolver.resolve_many(names)
+            batched = time.perf_counter() - start
+
+            start = time.perf_counter()
+            resolver.resolve_many(names)
+            cached = time.perf_counter() - start
+
+            rows.append({"drugs": n, "sequential_s": sequential, "batched_s": batched, "cached_s": cached})
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake PubChem latency per lookup in seconds")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    print(f"{'drugs':>6} {'sequential (s)':>15} {'batched (s)':>12} {'cached (ms)':>12}")
+    for row in run(args.sizes, args.latency, args.workers):
+        print(f"{row['drugs']:>6} {row['sequential_s']:>15.3f} {row['batched_s']:>12.3f} {row['cached_s'] * 1000:>12.3f}")
@@ -0,0 +1,73 @@
+"""
+Database size and pair-lookup latency: legacy SMILES-keyed raman table versus
+the interned integer schema built by ingest_ddi.py and the memory-mapped
+interaction_matrix snapshot, on synthetic data.
+
+    python -m benchmarks.bench_schema --drugs 600 --rows 500000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from itertools import combinations
+
+from benchmarks.fixtures import build_compact_db, build_legacy_db, synthetic_rows, synthetic_smiles
+from interaction_matrix import InteractionMatrix
+from interaction_store import InteractionStore
+
+
+def directory_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def build_snapshot(path: str, rows):
+    db_path = f"{path}.db"
+    build_compact_db(db_path, rows)
+    InteractionMatrix.from_db(db_path).save(path)
+
+
+def measure(path: str, drugs, patients: int, meds: int, seed: int = 1):
+    rng = random.Random(seed)
+    store = InteractionMatrix.load(path) if os.path.isdir(path) else InteractionStore(path)
+    latencies = []
+    for _ in range(patients):
+        pairs = list(combinations(rng.sample(drugs, meds), 2))
+        start = time.perf_counter()
+        store.lookup_pairs(pairs)
+        latencies.append(time.perf_counter() - start)
+    store.close()
+    latencies.sort()
+    return {
+        "size_mb": directory_size(path) / 1e6,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drugs", type=int, default=600)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--patients", type=int, default=200, help="Lookups to time")
+    parser.add_argument("--meds", type=int, default=10, help="Medications per patient")
+    args = parser.parse_args()
+
+    drugs = synthetic_smiles(args.drugs)
+    rows = synthetic_rows(drugs, args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for name, build in (("legacy", build_legacy_db), ("compact", build_compact_db), ("matrix", build_snapshot)):
+            path = os.path.join(tmp, name)
+            start = time.perf_counter()
+            build(path, rows)
+            build_s = time.perf_counter() - start
+            results[name] = dict(measure(path, drugs, args.patients, args.meds), build_s=build_s)
+
+    print(f"{'schema':>8} {'size (MB)':>10} {'build (s)':>10} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for name, r in results.items():
+        print(f"{name:>8} {r['size_mb']:>10.1f} {r['build_s']:>10.2f} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f}")
+    print(f"size ratio: {results['legacy']['size_mb'] / results['compact']['size_mb']:.1f}x")
@@ -0,0 +1,57 @@
+"""
+Tanimoto nearest-neighbour query latency against indexes of 10k-100k compounds,
+with and without bit-count pruning. Fingerprints are random packed bit
+vectors with 20-120 bits set (Morgan fingerprints of drug-like molecules set
+roughly 30-80 of 2048 bits), so no RDKit is needed.
+
+    python -m benchmarks.bench_similarity --sizes 10000 100000 --queries 500
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from fingerprint_store import N_BITS
+from similarity_index import SimilarityIndex
+
+
+def random_fingerprints(n: int, rng: np.random.Generator) -> np.ndarray:
+    dense = np.zeros((n, N_BITS), dtype=np.uint8)
+    for row, count in zip(dense, rng.integers(20, 121, size=n)):
+        row[rng.choice(N_BITS, size=count, replace=False)] = 1
+    return np.packbits(dense, axis=1)
+
+
+def measure(index: SimilarityIndex, queries: np.ndarray, k: int, min_similarity: float) -> dict:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, k, min_similarity)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 30_000, 100_000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--min-similarity", type=float, default=0.6)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Queries are perturbed copies of indexed fingerprints, so they have real near neighbours
+    print(f"{'compounds':>10} {'pruning':>8} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for size in args.sizes:
+        bits = random_fingerprints(size, rng)
+        index = SimilarityIndex([f"drug{i}" for i in range(size)], bits, radius=2, n_bits=N_BITS)
+        noise = random_fingerprints(args.queries, rng) & random_fingerprints(args.queries, rng)
+        queries = bits[rng.integers(0, size, size=args.queries)] ^ noise
+        for label, min_similarity in (("off", 0.0), (f">={args.min_similarity}", args.min_similarity)):
+            r = measure(index, queries, args.k, min_similarity)
+            print(f"{size:>10} {label:>8} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f}")
@@ -0,0 +1,91 @@
+"""
+Local stand-in for the PubChem PUG REST name -> SMILES endpoint.
+
+Serves /compound/name/<name>/property/CanonicalSMILES/JSON with a configurable
+per-request latency so resolution code can be exercised without network access.
+
+    python -m benchmarks.fake_pubchem --port 8765 --latency 0.2
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import unquote
+
+
+def synthetic_smiles(name: str) -> str:
+    # A deterministic, valid-looking alkane chain per name
+    return "C" * (1 + sum(map(ord, name)) % 40)
+
+
+class FakePubChem:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 compounds: Optional[Dict[str, str]] = None, unknown: tuple = ()):
+        self.latency = latency
+        self.compounds = {k.casefold(): v for k, v in (compounds or {}).items()}
+        self.unknown = {u.casefold() for u in unknown}
+        self.requests = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests += 1
+                parts = self.path.split("/")
+                if len(parts) < 5 or parts[1:3] != ["compound", "name"]:
+                    self._send(400, {"Fault": {"Message": "Bad request"}})
+                    return
+                name = unquote(parts[3])
+                time.sleep(fake.latency)
+                if name.casefold() in fake.unknown:
+                    self._send(404, {"Fault": {"Code": "PUGREST.NotFound"}})
+                    return
+                smiles = fake.compounds.get(name.casefold()) or synthetic_smiles(name)
+                self._send(200, {"PropertyTable": {"Properties": [{"CID": 1, "CanonicalSMILES": smiles}]}})
+
+            def _send(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake PubChem PUG REST server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds of delay per lookup")
+    args = parser.parse_args()
+    fake = FakePubChem(host=args.host, port=args.port, latency=args.latency)
+    print(f"Fake PubChem listening on {fake.base_url}")
+    fake.server.serve_forever()
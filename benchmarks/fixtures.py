@@ -0,0 +1,110 @@
+"""
+Synthetic data for the benchmarks: drug SMILES and names, raman interaction
+tables, and PDF/DOCX documents. Everything is seeded, so two runs with the
+same arguments see the same data.
+"""
+import io
+import random
+import sqlite3
+import zipfile
+from typing import List, Optional, Tuple
+
+import ingest_ddi
+import interaction_store
+
+LINE = "Patient was administered 81 mg aspirin and 20 mg atorvastatin; blood pressure stable, no acute distress. "
+FRAGMENTS = ["C", "CC", "O", "N", "C(=O)", "c1ccccc1", "C(=O)O", "Cl", "F", "OC", "N(C)C", "S(=O)(=O)"]
+
+
+def synthetic_smiles(n_drugs: int, seed: int = 0) -> List[str]:
+    """Unique SMILES-like strings with the length distribution of TWOSIDES drugs (~20-90 chars)."""
+    rng = random.Random(seed)
+    drugs = set()
+    while len(drugs) < n_drugs:
+        drugs.add("".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(6, 24))))
+    return sorted(drugs)
+
+
+def synthetic_names(drugs: List[str]) -> List[Tuple[str, str]]:
+    """A made-up (name, SMILES) per drug, e.g. ("benchamol12", ...); names are single tokens for the matcher."""
+    return [(f"benchamol{i}", smiles) for i, smiles in enumerate(drugs)]
+
+
+def synthetic_rows(drugs: List[str], n_rows: int, n_labels: int = 1317, seed: int = 0) -> List[Tuple[str, str, int]]:
+    """(Drug1, Drug2, Y) rows; with few drugs and many rows, pairs repeat across labels as in TWOSIDES."""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n_rows):
+        a, b = rng.sample(drugs, 2)
+        rows.append((a, b, rng.randrange(n_labels)))
+    return rows
+
+
+def build_legacy_db(path: str, rows: List[Tuple[str, str, int]]):
+    """The original schema: raman(Drug1, Drug2, Y) on SMILES strings, with the covering pair index."""
+    conn = sqlite3.connect(path)
+    conn.execute('''create table raman (Drug1 text, Drug2 text, Y integer)''')
+    conn.executemany('''insert into raman (Drug1, Drug2, Y) values (?, ?, ?)''', rows)
+    conn.commit()
+    conn.close()
+    interaction_store.migrate(path)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def build_compact_db(path: str, rows: List[Tuple[str, str, int]], n_labels: int = 1317,
+                     names: Optional[List[Tuple[str, str]]] = None):
+    """The interned integer schema built by ingest_ddi.py, with optional (name, SMILES) synonyms."""
+    conn = sqlite3.connect(path)
+    ingest_ddi.create_schema(conn)
+    ingest_ddi.ingest_rows(conn, rows)
+    ingest_ddi.ingest_labels(conn, {i: f"side effect {i}" for i in range(n_labels)})
+    if names:
+        ingest_ddi.ingest_names(conn, names)
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def synthetic_pdf(n_pages: int, lines_per_page: int = 40) -> bytes:
+    import fitz
+    doc = fitz.open()
+    for i in range(n_pages):
+        page = doc.new_page()
+        text = "\n".join(f"{i}.{j} {LINE}" for j in range(lines_per_page))
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=7)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def synthetic_docx(n_paragraphs: int) -> bytes:
+    """A minimal WordprocessingML package, written directly so no DOCX writer is needed."""
+    body = "".join(f"<w:p><w:r><w:t>{i} {LINE}</w:t></w:r></w:p>" for i in range(n_paragraphs))
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml",
+                      '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                      '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                      '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                      '<Default Extension="xml" ContentType="application/xml"/>'
+                      '<Override PartName="/word/document.xml" '
+                      'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+                      '</Types>')
+        docx.writestr("_rels/.rels",
+                      '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                      '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                      '<Relationship Id="rId1" '
+                      'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+                      'Target="word/document.xml"/></Relationships>')
+        docx.writestr("word/_rels/document.xml.rels",
+                      '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                      '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"/>')
+        docx.writestr("word/document.xml",
+                      '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                      '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                      f'<w:body>{body}</w:body></w:document>')
+    return buffer.getvalue()
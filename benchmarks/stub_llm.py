@@ -0,0 +1,29 @@
+"""
+Deterministic stand-in for LiteLLMModel.
+
+Every call sleeps for a configurable latency, then answers with a code block
+that calls final_answer(), so CodeAgents finish in one step without network
+access or an API key.
+"""
+import time
+
+from smolagents.models import ChatMessage, MessageRole, Model
+
+DEFAULT_ANSWER = ["aspirin", "atorvastatin"]
+
+
+class StubModel(Model):
+    def __init__(self, latency: float = 0.0, answer=None, model_id: str = "stub"):
+        super().__init__(model_id=model_id)
+        self.latency = latency
+        self.answer = DEFAULT_ANSWER if answer is None else answer
+        self.calls = 0
+
+    def generate(self, messages, stop_sequences=None, response_format=None, tools_to_call_from=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return ChatMessage(role=MessageRole.ASSISTANT,
+                           content=f"Thought: Answering directly.\n```py\nfinal_answer({self.answer!r})\n```")
+
+    def __call__(self, messages, stop_sequences=None, response_format=None, tools_to_call_from=None, **kwargs):
+        return self.generate(messages, stop_sequences, response_format, tools_to_call_from, **kwargs)
@@ -0,0 +1,297 @@
+"""
+Reproducible benchmark suite: drug extraction, document parsing, SMILES
+resolution, interaction lookups and the end-to-end endpoint.
+
+Everything runs offline. The agents use StubModel with a fixed latency,
+PubChem is served by FakePubChem, and the interaction database, drug names and
+PDF/DOCX documents are synthetic and seeded. Each case reports throughput and
+p50/p95/p99 latency; results are written as JSON and can be compared against a
+saved baseline, in which case the exit status is 1 when a case got slower by
+more than --tolerance.
+
+    python -m benchmarks.suite --out results.json
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+SUITES = ("startup", "extraction", "documents", "resolution", "interactions", "endpoint")
+
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    return sorted_samples[min(len(sorted_samples) - 1, int(round(q * (len(sorted_samples) - 1))))]
+
+
+def summarize(suite: str, case: str, latencies: List[float], elapsed: float, **extra) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "suite": suite,
+        "case": case,
+        "n": len(latencies),
+        "throughput_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        **extra,
+    }
+
+
+def measure(suite: str, case: str, fn: Callable[[], object], iterations: int, warmup: int = 1, setup=None) -> dict:
+    """Calls fn iterations times (after warmup calls); setup, if given, runs untimed before every call."""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    latencies = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize(suite, case, latencies, sum(latencies))
+
+
+def import_profile(stderr: str, top: int = 10) -> List[dict]:
+    """The slowest top-level imports from `python -X importtime` output, by cumulative time."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            modules.append({"module": name.strip(), "cumulative_ms": int(cumulative) / 1000})
+    return sorted(modules, key=lambda m: -m["cumulative_ms"])[:top]
+
+
+def bench_startup(args, data) -> List[dict]:
+    """Cold import of the API module in a fresh interpreter, which is what a new container or --reload pays."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable, "-X", "importtime", "-c", "import patient_help_api"]
+    latencies = []
+    profile = []
+    for _ in range(max(3, args.iterations // 20)):
+        start = time.perf_counter()
+        completed = subprocess.run(command, cwd=root, env=os.environ, capture_output=True, text=True, check=True)
+        latencies.append(time.perf_counter() - start)
+        profile = import_profile(completed.stderr)
+    row = summarize("startup", "import patient_help_api", latencies, sum(latencies), top_imports=profile)
+    for module in profile:
+        print(f"{'':>13} {module['module']:>32} {module['cumulative_ms']:>9.1f} ms")
+    return [row]
+
+
+def bench_extraction(args, data) -> List[dict]:
+    from drug_extractor import DrugExtractor
+
+    extractor = DrugExtractor(name for name, _ in data["names"])
+    rng = random.Random(args.seed)
+    medications = ", ".join(name for name, _ in rng.sample(data["names"], 5))
+    document = " ".join(f"{line} {name}" for line, (name, _) in zip(range(2000), itertools.cycle(data["names"])))
+    return [
+        measure("extraction", "medications field, 5 drugs", lambda: extractor.extract(medications), args.iterations),
+        measure("extraction", "with 2000-line document", lambda: extractor.extract(medications, document), args.iterations),
+    ]
+
+
+def bench_documents(args, data) -> List[dict]:
+    from document_text import extract_pdf_text, extract_word_text, shutdown_pdf_pool
+
+    rows = [
+        measure("documents", f"pdf, {args.pdf_pages} pages", lambda: extract_pdf_text(data["pdf"]), max(3, args.iterations // 10)),
+        measure("documents", f"docx, {args.docx_paragraphs} paragraphs", lambda: extract_word_text(data["docx"]), max(3, args.iterations // 10)),
+    ]
+    shutdown_pdf_pool()
+    return rows
+
+
+def bench_resolution(args, data) -> List[dict]:
+    from drug_cache import SmilesCache
+    from pubchem_resolver import PubChemResolver
+
+    names = [f"unlisted-drug-{i}" for i in range(args.batch_drugs)]
+    resolvers = []
+
+    def cold():
+        cache = SmilesCache(path=os.path.join(data["tmp"], f"resolution-{len(resolvers)}.db"))
+        resolvers.append(PubChemResolver(base_url=data["pubchem_url"], cache=cache))
+
+    def resolve():
+        return resolvers[-1].resolve_many(names)
+
+    return [
+        measure("resolution", f"{args.batch_drugs} drugs, cold cache", resolve, max(3, args.iterations // 10), setup=cold),
+        measure("resolution", f"{args.batch_drugs} drugs, warm cache", resolve, args.iterations),
+    ]
+
+
+def bench_interactions(args, data) -> List[dict]:
+    from interaction_store import InteractionStore
+
+    store = InteractionStore(data["db"])
+    rng = random.Random(args.seed)
+    rows = []
+    for k in (2, 5, 10):
+        drugs = rng.sample(data["drugs"], k)
+        pairs = list(itertools.combinations(drugs, 2))
+        rows.append(measure("interactions", f"{k} drugs, {len(pairs)} pairs", lambda: store.lookup_pairs(pairs), args.iterations))
+    store.close()
+    return rows
+
+
+def bench_endpoint(args, data) -> List[dict]:
+    import httpx
+
+    import patient_help_api
+    from benchmarks.stub_llm import StubModel
+
+    rng = random.Random(args.seed)
+    answer = [name for name, _ in rng.sample(data["names"], 4)]
+    patient_help_api.warm_up(model=StubModel(latency=args.llm_latency, answer=answer))
+    payload = {
+        "age": "45", "sex": "Male", "height": "175", "weight": "85",
+        "allergies": "Shellfish", "preexisting_conditions": "Hypertension",
+        "medications": ", ".join(answer), "family_history": "Heart Disease",
+        "question": "I feel dizzy after taking my medication. What could be wrong?",
+    }
+
+    async def run_level(concurrency: int):
+        latencies = []
+
+        async def client_loop(client):
+            for _ in range(args.requests_per_client):
+                start = time.perf_counter()
+                response = await client.post("/process-patient-data/", data=payload)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        transport = httpx.ASGITransport(app=patient_help_api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+        return summarize("endpoint", f"{concurrency} concurrent clients", latencies, elapsed)
+
+    return [asyncio.run(run_level(level)) for level in args.concurrency]
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float) -> List[dict]:
+    """Cases whose p50 rose or whose throughput fell by more than tolerance relative to the baseline."""
+    previous = {(r["suite"], r["case"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        b = previous.get((r["suite"], r["case"]))
+        if b is None:
+            continue
+        p50_change = r["p50_ms"] / b["p50_ms"] - 1 if b["p50_ms"] else 0.0
+        throughput_change = r["throughput_per_s"] / b["throughput_per_s"] - 1 if b["throughput_per_s"] else 0.0
+        r["p50_change"] = p50_change
+        r["throughput_change"] = throughput_change
+        if p50_change > tolerance or throughput_change < -tolerance:
+            regressions.append(r)
+    return regressions
+
+
+def prepare(args, tmp: str, pubchem_url: str) -> dict:
+    """Points the application at synthetic fixtures; must run before any application module is imported."""
+    os.environ.update({
+        "DATABASE_URL": os.path.join(tmp, "raman.db"),
+        "SMILES_CACHE_PATH": os.path.join(tmp, "smiles_cache.db"),
+        "PUBCHEM_BASE_URL": pubchem_url,
+        "DOCUMENT_CACHE_DIR": os.path.join(tmp, "document_cache"),
+        "JOB_DB_PATH": os.path.join(tmp, "jobs.db"),
+        "BATCH_DIR": os.path.join(tmp, "batches"),
+        "PATIENT_STATE_PATH": os.path.join(tmp, "patient_state.db"),
+        "FINGERPRINT_STORE_PATH": os.path.join(tmp, "raman.fingerprints"),
+        "PREDICTOR_WEIGHTS_PATH": "",
+        "INTERACTION_ENGINE": "sqlite",
+        "DRUG_NAMES_PATH": "",
+        "RESPONSE_CACHE_BACKEND": "off",
+        "JOB_WORKERS": "0",
+    })
+    from benchmarks import fixtures
+
+    drugs = fixtures.synthetic_smiles(args.drugs, seed=args.seed)
+    names = fixtures.synthetic_names(drugs)
+    fixtures.build_compact_db(os.environ["DATABASE_URL"], fixtures.synthetic_rows(drugs, args.rows, seed=args.seed), names=names)
+    data = {"tmp": tmp, "db": os.environ["DATABASE_URL"], "drugs": drugs, "names": names, "pubchem_url": pubchem_url}
+    if "documents" in args.suites:
+        data["pdf"] = fixtures.synthetic_pdf(args.pdf_pages)
+        data["docx"] = fixtures.synthetic_docx(args.docx_paragraphs)
+    return data
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=100, help="Timed calls per micro-benchmark case")
+    parser.add_argument("--drugs", type=int, default=600, help="Drugs in the synthetic interaction database")
+    parser.add_argument("--rows", type=int, default=200000, help="Interaction rows in the synthetic database")
+    parser.add_argument("--pdf-pages", type=int, default=50)
+    parser.add_argument("--docx-paragraphs", type=int, default=2000)
+    parser.add_argument("--batch-drugs", type=int, default=8, help="Drug names per resolution batch")
+    parser.add_argument("--pubchem-latency", type=float, default=0.05, help="Fake PubChem latency per lookup in seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Stub LLM latency per call in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests-per-client", type=int, default=4)
+    parser.add_argument("--out", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="Compare against results saved with --save-baseline")
+    parser.add_argument("--save-baseline", default=None, help="Also write the results to this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before a case is a regression")
+    args = parser.parse_args(argv)
+
+    from benchmarks.fake_pubchem import FakePubChem
+
+    benches = {"startup": bench_startup, "extraction": bench_extraction, "documents": bench_documents, "resolution": bench_resolution,
+               "interactions": bench_interactions, "endpoint": bench_endpoint}
+    results = []
+    with FakePubChem(latency=args.pubchem_latency) as fake, tempfile.TemporaryDirectory() as tmp:
+        data = prepare(args, tmp, fake.base_url)
+        print(f"{'suite':>13} {'case':>32} {'n':>5} {'ops/s':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}")
+        for suite in args.suites:
+            for r in benches[suite](args, data):
+                results.append(r)
+                print(f"{r['suite']:>13} {r['case']:>32} {r['n']:>5} {r['throughput_per_s']:>9.1f} "
+                      f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['suite']} / {r['case']}: p50 {r['p50_change']:+.0%}, throughput {r['throughput_change']:+.0%}")
+        if not regressions:
+            print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "save_baseline")},
+        },
+        "results": results,
+    }
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Database Configuration
+DATABASE_PATH = os.getenv("DATABASE_URL", os.path.join(os.path.dirname(os.path.abspath(__file__)), "raman.db"))
+
+# Drug name -> SMILES cache
+SMILES_CACHE_PATH = os.getenv("SMILES_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "smiles_cache.db"))
+SMILES_CACHE_LRU_SIZE = int(os.getenv("SMILES_CACHE_LRU_SIZE", "4096"))
+SMILES_CACHE_NEGATIVE_TTL = float(os.getenv("SMILES_CACHE_NEGATIVE_TTL", "86400"))  # seconds
+
+# PubChem PUG REST resolution
+PUBCHEM_BASE_URL = os.getenv("PUBCHEM_BASE_URL", "https://pubchem.ncbi.nlm.nih.gov/rest/pug")
+PUBCHEM_MAX_WORKERS = int(os.getenv("PUBCHEM_MAX_WORKERS", "8"))
+PUBCHEM_TIMEOUT = float(os.getenv("PUBCHEM_TIMEOUT", "5"))  # seconds per lookup attempt
+PUBCHEM_RETRIES = int(os.getenv("PUBCHEM_RETRIES", "2"))
+PUBCHEM_BACKOFF = float(os.getenv("PUBCHEM_BACKOFF", "0.5"))  # seconds, doubled on each retry
+
+# Interaction lookups: "sqlite" (interaction_store) or "matrix" (memory-mapped interaction_matrix snapshot)
+INTERACTION_ENGINE = os.getenv("INTERACTION_ENGINE", "sqlite")
+INTERACTION_SNAPSHOT_PATH = os.getenv("INTERACTION_SNAPSHOT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "raman.snapshot"))
+
+# LLM backend and agents
+LLM_MODEL_ID = os.getenv("LLM_MODEL_ID", "gemini/gemini-2.0-flash")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))  # seconds
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+# Agents per role, i.e. concurrent requests per role; defaults to one per analysis worker
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", os.getenv("ANALYSIS_WORKERS", "16")))
+
+# Analysis execution: worker threads, admission control and per-stage timeouts (seconds)
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "16"))
+MAX_IN_FLIGHT_ANALYSES = int(os.getenv("MAX_IN_FLIGHT_ANALYSES", "64"))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "5"))
+STAGE_TIMEOUTS = {
+    "documents": float(os.getenv("STAGE_TIMEOUT_DOCUMENTS", "60")),
+    "extraction": float(os.getenv("STAGE_TIMEOUT_EXTRACTION", "120")),
+    "interactions": float(os.getenv("STAGE_TIMEOUT_INTERACTIONS", "120")),
+    "summary": float(os.getenv("STAGE_TIMEOUT_SUMMARY", "120")),
+}
+
+# Local drug entity extraction; the LLM is only asked when the matcher's confidence is below the threshold
+DRUG_NAMES_PATH = os.getenv("DRUG_NAMES_PATH") or None  # optional CSV with name,smiles columns
+DRUG_MATCH_MIN_CONFIDENCE = float(os.getenv("DRUG_MATCH_MIN_CONFIDENCE", "1.0"))
+
+# Extracted document text cache, keyed by SHA-256 of the upload
+DOCUMENT_CACHE_DIR = os.getenv("DOCUMENT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "document_cache"))
+DOCUMENT_CACHE_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# PDF text extraction
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "1000"))
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", "2000000"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))  # smaller documents are extracted in-thread
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "32"))
+
+# Upload limits (bytes); uploads stay in memory up to UPLOAD_SPOOL_BYTES, then spill to a temp file
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(10 * 1024 * 1024)))
+MAX_REQUEST_SIZE = int(os.getenv("MAX_REQUEST_SIZE", str(32 * 1024 * 1024)))
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(8 * 1024 * 1024)))
+
+# Document context sent to the LLM: top-k BM25 passages within a token budget
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+CONTEXT_TOP_K = int(os.getenv("CONTEXT_TOP_K", "8"))
+CONTEXT_CHUNK_WORDS = int(os.getenv("CONTEXT_CHUNK_WORDS", "120"))
+CONTEXT_CHUNK_OVERLAP = int(os.getenv("CONTEXT_CHUNK_OVERLAP", "30"))
+
+# Cache of finished analyses keyed by a fingerprint of the request: "memory" (per process), "redis" (shared) or "off"
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/0")
+
+# Batch analysis (batch.py and POST /process-patient-data/batch)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))  # records in their LLM stages at once
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "64"))  # records per checkpoint and per shared lookup
+BATCH_DIR = os.getenv("BATCH_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "batches"))
+
+# Job queue (jobs.py): SQLite job table and worker processes started with the API (0 to run them separately)
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.db"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))  # seconds between polls of an empty queue
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "900"))  # seconds a job may run before it is requeued
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Return the per-stage timings of every request in a Server-Timing header (or per request with an X-Trace header)
+TRACE_REQUESTS = os.getenv("TRACE_REQUESTS", "false").lower() in ("1", "true", "yes")
+
+# Startup: import plus warm-up time (seconds) above which startup is logged as over budget
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "10"))
+
+# Side-effect predictor for drug pairs missing from the interaction database (interaction_predictor.py)
+PREDICTOR_WEIGHTS_PATH = os.getenv("PREDICTOR_WEIGHTS_PATH") or None  # .npz from `interaction_predictor.py export`; off if unset
+PREDICTOR_TOP_K = int(os.getenv("PREDICTOR_TOP_K", "5"))
+PREDICTOR_MIN_PROBABILITY = float(os.getenv("PREDICTOR_MIN_PROBABILITY", "0.05"))
+PREDICTOR_WORKERS = int(os.getenv("PREDICTOR_WORKERS", str(min(4, os.cpu_count() or 1))))  # fingerprint threads
+
+# Analysis state of returning patients (patient_state.py), keyed by the optional session_id form field
+PATIENT_STATE_PATH = os.getenv("PATIENT_STATE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "patient_state.db"))
+PATIENT_STATE_TTL = float(os.getenv("PATIENT_STATE_TTL", str(30 * 24 * 3600)))  # seconds since the session's last request
+
+# Bit-packed Morgan fingerprints of the database's drugs (fingerprint_store.py); used when the directory exists
+FINGERPRINT_STORE_PATH = os.getenv("FINGERPRINT_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "raman.fingerprints"))
+
+# Drugs missing from the database borrow the interactions of their closest analogues (similarity_index.py)
+SIMILARITY_NEIGHBOURS = int(os.getenv("SIMILARITY_NEIGHBOURS", "3"))  # analogues tried per missing drug
+SIMILARITY_MIN_TANIMOTO = float(os.getenv("SIMILARITY_MIN_TANIMOTO", "0.6"))
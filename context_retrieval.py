@@ -0,0 +1,112 @@
+"""
+Relevance filtering of uploaded document text before it goes into a prompt.
+
+The extracted text is split into overlapping word windows, the windows are
+scored against the patient's question and medications with BM25 (NumPy), and
+only the top-k passages that fit in config.CONTEXT_TOKEN_BUDGET are kept, in
+document order. Documents already under the budget pass through untouched.
+"""
+import re
+import threading
+from collections import Counter
+from typing import List
+
+import numpy as np
+
+import config
+
+WORD = re.compile(r"[a-z0-9]+")
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Common English words carry no signal for the question but dominate BM25 on short queries
+STOP_WORDS = frozenset("""a an and are as at be but by can could did do does for from had has have he her his how i if in
+into is it its me my no not of on or our she so than that the their them then there these they this to too was we were
+what when where which who why will with would you your""".split())
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)."""
+    return (len(text) + 3) // 4
+
+
+def tokenize(text: str) -> List[str]:
+    return [w for w in WORD.findall(text.lower()) if w not in STOP_WORDS]
+
+
+def chunk_text(text: str, words: int = config.CONTEXT_CHUNK_WORDS, overlap: int = config.CONTEXT_CHUNK_OVERLAP) -> List[str]:
+    tokens = text.split()
+    step = max(1, words - overlap)
+    return [" ".join(tokens[start:start + words]) for start in range(0, max(len(tokens) - overlap, 1), step)]
+
+
+def bm25_scores(chunks: List[str], query: str) -> np.ndarray:
+    query_terms = list(dict.fromkeys(tokenize(query)))
+    if not query_terms or not chunks:
+        return np.zeros(len(chunks))
+    term_index = {term: i for i, term in enumerate(query_terms)}
+    tf = np.zeros((len(chunks), len(query_terms)), dtype=np.float32)
+    lengths = np.empty(len(chunks), dtype=np.float32)
+    for row, chunk in enumerate(chunks):
+        words = tokenize(chunk)
+        lengths[row] = len(words)
+        for term, count in Counter(w for w in words if w in term_index).items():
+            tf[row, term_index[term]] = count
+    df = (tf > 0).sum(axis=0)
+    idf = np.log1p((len(chunks) - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(lengths.mean(), 1.0))
+    return ((tf * (BM25_K1 + 1)) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+
+class RetrievalStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def record(self, before: int, after: int):
+        with self._lock:
+            self.requests += 1
+            self.tokens_before += before
+            self.tokens_after += after
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "document_tokens_before": self.tokens_before,
+                "document_tokens_after": self.tokens_after,
+                "avg_tokens_before": self.tokens_before / self.requests if self.requests else 0.0,
+                "avg_tokens_after": self.tokens_after / self.requests if self.requests else 0.0,
+            }
+
+
+stats = RetrievalStats()
+
+
+def select_relevant_context(text: str, query: str, token_budget: int = config.CONTEXT_TOKEN_BUDGET,
+                            top_k: int = config.CONTEXT_TOP_K) -> str:
+    """
+    Returns the passages of text most relevant to query, within token_budget.
+
+    Args:
+        text: The extracted document text.
+        query: What the passages should be about, e.g. the question plus the medications.
+    """
+    before = estimate_tokens(text)
+    if before <= token_budget:
+        stats.record(before, before)
+        return text
+    chunks = chunk_text(text)
+    scores = bm25_scores(chunks, query)
+    selected = []
+    used = 0
+    for i in np.argsort(-scores, kind="stable")[:top_k]:
+        cost = estimate_tokens(chunks[i])
+        if used + cost > token_budget:
+            continue
+        selected.append(int(i))
+        used += cost
+    passages = "\n...\n".join(chunks[i] for i in sorted(selected))
+    stats.record(before, estimate_tokens(passages))
+    return passages
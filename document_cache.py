@@ -0,0 +1,104 @@
+"""
+Content-addressed cache of text extracted from uploaded documents.
+
+Uploads are hashed (SHA-256) while they are streamed in (see uploads.py); the
+extracted text is stored on disk under that hash, so a repeat upload of the
+same discharge summary skips the PDF/DOCX parse. The cache is
+bounded by total size and evicts least recently used entries first.
+"""
+import os
+import threading
+from typing import Optional
+
+import config
+
+
+class DocumentTextCache:
+    def __init__(self, directory: str = config.DOCUMENT_CACHE_DIR, max_bytes: int = config.DOCUMENT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._sizes = {}
+        for name in os.listdir(directory):
+            if name.endswith(".txt"):
+                self._sizes[name[:-4]] = os.path.getsize(os.path.join(directory, name))
+        self.total_bytes = sum(self._sizes.values())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            os.utime(path)  # mtime doubles as the LRU clock
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key: str, text: str):
+        data = text.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.total_bytes += len(data) - self._sizes.get(key, 0)
+            self._sizes[key] = len(data)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = []
+        for key in self._sizes:
+            try:
+                entries.append((os.path.getmtime(self._path(key)), key))
+            except OSError:
+                entries.append((0, key))
+        for _, key in sorted(entries):
+            if self.total_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            self.total_bytes -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._sizes),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_default_cache: Optional[DocumentTextCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_document_cache() -> DocumentTextCache:
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = DocumentTextCache()
+    return _default_cache
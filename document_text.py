@@ -0,0 +1,123 @@
+"""
+Text extraction from uploaded documents, given as bytes or a path.
+
+PDFs are opened straight from the upload buffer (fitz.open(stream=...)) and
+page texts are joined once instead of concatenated page by page. Large
+documents are split into page ranges that are extracted on a process pool,
+and extraction stops at config.PDF_MAX_PAGES pages / PDF_MAX_CHARS characters.
+The pool workers open the document from a path: a PDF held in memory is
+written to one temp file for them rather than pickled into every task.
+"""
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Union
+
+import config
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn, not fork: the API process is multi-threaded
+                _pool = ProcessPoolExecutor(max_workers=config.PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pdf_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _open_pdf(source: Union[bytes, str]):
+    import fitz
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def _page_texts(pdf_document, start: int, stop: int, max_chars: int):
+    chars = 0
+    for page_number in range(start, stop):
+        text = pdf_document[page_number].get_text()
+        yield text
+        chars += len(text)
+        if chars >= max_chars:
+            return
+
+
+def extract_pdf_range(source: Union[bytes, str], start: int, stop: int, max_chars: int) -> str:
+    """Text of pages [start, stop), one page per line block; runs in pool workers."""
+    pdf_document = _open_pdf(source)
+    try:
+        return "\n".join(_page_texts(pdf_document, start, stop, max_chars))
+    finally:
+        pdf_document.close()
+
+
+def extract_pdf_text(source: Union[bytes, str], max_pages: int = config.PDF_MAX_PAGES, max_chars: int = config.PDF_MAX_CHARS,
+                     parallel_min_pages: int = config.PDF_PARALLEL_MIN_PAGES, pages_per_task: int = config.PDF_PAGES_PER_TASK) -> str:
+    """
+    Extracts the text of a PDF given as bytes or a path.
+
+    Documents of at least parallel_min_pages pages are split into ranges of
+    pages_per_task pages extracted on the process pool, unless PDF_WORKERS < 2.
+    """
+    pdf_document = _open_pdf(source)
+    try:
+        n_pages = min(pdf_document.page_count, max_pages)
+        if n_pages < parallel_min_pages or config.PDF_WORKERS < 2:
+            return "\n".join(_page_texts(pdf_document, 0, n_pages, max_chars)).strip()[:max_chars]
+    finally:
+        pdf_document.close()
+
+    spill_path = None
+    if not isinstance(source, str):
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as spill:
+            spill.write(source)
+        source = spill_path = spill.name
+    try:
+        pool = get_pdf_pool()
+        ranges = [(start, min(start + pages_per_task, n_pages)) for start in range(0, n_pages, pages_per_task)]
+        futures = [pool.submit(extract_pdf_range, source, start, stop, max_chars) for start, stop in ranges]
+        parts = []
+        chars = 0
+        try:
+            for future in futures:
+                if chars >= max_chars:
+                    break
+                part = future.result()
+                parts.append(part)
+                chars += len(part)
+        finally:
+            # Past the character limit, or after a failed range, the remaining ranges are not needed
+            for future in futures:
+                future.cancel()
+        return "\n".join(parts).strip()[:max_chars]
+    finally:
+        if spill_path:
+            # A range still running after cancel() has the file open or fails; its result is not used
+            try:
+                os.remove(spill_path)
+            except OSError as e:
+                print(f"Failed to delete PDF spill file {spill_path}: {e}")
+
+
+def extract_word_text(source: Union[bytes, str]) -> str:
+    """Extracts the text of a .docx given as bytes or a path."""
+    from docx2python import docx2python
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    doc_content = docx2python(source)
+    return doc_content.text.strip()
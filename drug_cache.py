@@ -0,0 +1,175 @@
+"""
+Drug name -> SMILES resolution cache.
+
+An in-process LRU sits in front of a persistent SQLite store so repeat
+medications never go back to PubChem. Names that PubChem does not know are
+cached as negative entries with a TTL; network failures are never cached.
+
+Pre-seed the store offline from the interaction database:
+
+    python drug_cache.py seed --db raman.db --names drug_names.csv
+"""
+import argparse
+import csv
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import config
+
+# Returned by SmilesCache.get when nothing (positive or negative) is cached
+MISS = object()
+
+
+def normalize_name(drug_name: str) -> str:
+    """Case- and whitespace-insensitive cache key for a drug name."""
+    return " ".join(str(drug_name).split()).casefold()
+
+
+class SmilesCache:
+    def __init__(self, path: str = config.SMILES_CACHE_PATH, lru_size: int = config.SMILES_CACHE_LRU_SIZE,
+                 negative_ttl: float = config.SMILES_CACHE_NEGATIVE_TTL):
+        self.path = path
+        self.lru_size = lru_size
+        self.negative_ttl = negative_ttl
+        self._lru = OrderedDict()  # key -> (smiles or None, expires_at or None)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''create table if not exists smiles_cache (
+                                  name text primary key,
+                                  smiles text,
+                                  expires_at real
+                              ) without rowid''')
+        self._conn.commit()
+
+    def _remember(self, key: str, entry: Tuple[Optional[str], Optional[float]]):
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get(self, drug_name: str):
+        """
+        Looks a drug name up in the LRU, then on disk.
+
+        Returns:
+            The cached SMILES, None for a cached negative result, or MISS.
+        """
+        key = normalize_name(drug_name)
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                row = self._conn.execute('''select smiles, expires_at from smiles_cache where name = ?''', (key,)).fetchone()
+                if row is None:
+                    return MISS
+                entry = (row[0], row[1])
+            if entry[1] is not None and entry[1] <= now:
+                self._lru.pop(key, None)
+                return MISS
+            self._remember(key, entry)
+            return entry[0]
+
+    def put(self, drug_name: str, smiles: Optional[str]):
+        """Stores a resolution; smiles=None records a negative result that expires after negative_ttl."""
+        self.put_many([(drug_name, smiles)])
+
+    def put_many(self, items: Iterable[Tuple[str, Optional[str]]]):
+        now = time.time()
+        rows = []
+        with self._lock:
+            for drug_name, smiles in items:
+                key = normalize_name(drug_name)
+                if not key:
+                    continue
+                expires_at = None if smiles else now + self.negative_ttl
+                self._remember(key, (smiles or None, expires_at))
+                rows.append((key, smiles or None, expires_at))
+            self._conn.executemany('''insert or replace into smiles_cache (name, smiles, expires_at) values (?, ?, ?)''', rows)
+            self._conn.commit()
+        return len(rows)
+
+    def known_names(self) -> List[str]:
+        """Every name cached with a SMILES."""
+        with self._lock:
+            rows = self._conn.execute('''select name from smiles_cache where smiles is not null''').fetchall()
+        return [name for (name,) in rows]
+
+    def drop_self_keys(self) -> int:
+        """Removes entries whose key is their own casefolded SMILES, as earlier versions of seed_from_db wrote."""
+        with self._lock:
+            n = self._conn.execute('''delete from smiles_cache where smiles is not null and name = lower(smiles)''').rowcount
+            self._conn.commit()
+            self._lru.clear()
+        return n
+
+    def resolve(self, drug_name: str, fetch: Callable[[str], Optional[str]]) -> Optional[str]:
+        """
+        Returns the SMILES for drug_name, calling fetch only on a cache miss.
+        Exceptions from fetch (e.g. PubChem unreachable) propagate and are not cached.
+        """
+        smiles = self.get(drug_name)
+        if smiles is not MISS:
+            return smiles
+        smiles = fetch(" ".join(str(drug_name).split()))
+        self.put(drug_name, smiles)
+        return smiles
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> SmilesCache:
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = SmilesCache()
+    return _default_cache
+
+
+def seed_from_db(cache: SmilesCache, db_path: str = config.DATABASE_PATH, names_path: Optional[str] = None) -> int:
+    """
+    Fills the cache without touching the network, from the database's drug_names
+    table and an optional CSV with `name,smiles` columns.
+
+    SMILES are not stored as resolving to themselves: keys are casefolded, and
+    SMILES differing only in case (aromatic c1ccccc1, aliphatic C1CCCCC1) are
+    different molecules. Such entries left by earlier seeds are removed.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        names = []
+        if conn.execute("select 1 from sqlite_master where type = 'table' and name = 'drug_names'").fetchone():
+            names = conn.execute('''select n.name, d.smiles from drug_names n join drugs d on d.id = n.drug_id''').fetchall()
+    finally:
+        conn.close()
+    cache.drop_self_keys()
+    count = cache.put_many(names)
+    if names_path:
+        with open(names_path, newline="") as f:
+            count += cache.put_many((row["name"], row["smiles"]) for row in csv.DictReader(f) if row.get("smiles"))
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drug name -> SMILES cache maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    seed = subparsers.add_parser("seed", help="Pre-seed the cache from the interaction database")
+    seed.add_argument("--db", default=config.DATABASE_PATH, help="Path to the interaction database")
+    seed.add_argument("--names", default=None, help="Optional CSV file with name,smiles columns")
+    seed.add_argument("--cache", default=config.SMILES_CACHE_PATH, help="Path to the SMILES cache database")
+    args = parser.parse_args()
+
+    if args.command == "seed":
+        n = seed_from_db(SmilesCache(path=args.cache), db_path=args.db, names_path=args.names)
+        print(f"Seeded {n} entries into {args.cache}")
@@ -0,0 +1,132 @@
+"""
+Deterministic drug entity extraction with a spaCy PhraseMatcher.
+
+The vocabulary is every drug name and synonym known locally: the drug_names
+table of the interaction database, names already resolved in the SMILES cache
+and an optional `name,smiles` CSV. The medications field and uploaded document
+text are matched case-insensitively; the LLM extraction agent is only needed
+when the matcher finds nothing or covers too little of the medications field.
+"""
+import csv
+import re
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+import config
+from drug_cache import get_default_cache, normalize_name
+
+# Medication fields are free text lists: "Aspirin 81mg, Atorvastatin; metformin"
+MEDICATION_SEPARATORS = re.compile(r"[,;\n/]+|\band\b", re.IGNORECASE)
+MIN_NAME_LENGTH = 3
+
+
+def load_vocabulary(db_path: str = config.DATABASE_PATH, names_path: Optional[str] = config.DRUG_NAMES_PATH) -> List[str]:
+    names = []
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            if conn.execute("select 1 from sqlite_master where type = 'table' and name = 'drug_names'").fetchone():
+                names.extend(name for (name,) in conn.execute('''select name from drug_names'''))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Could not read drug names from {db_path}: {e}")
+    names.extend(get_default_cache().known_names())
+    if names_path:
+        try:
+            with open(names_path, newline="") as f:
+                names.extend(row["name"] for row in csv.DictReader(f) if row.get("name"))
+        except OSError as e:
+            print(f"Could not read drug names from {names_path}: {e}")
+    return names
+
+
+class DrugExtractor:
+    def __init__(self, names: Iterable[str]):
+        import spacy
+        from spacy.matcher import PhraseMatcher
+
+        self.nlp = spacy.blank("en")
+        self.nlp.max_length = 50_000_000  # tokenizer only, documents can be long
+        self.matcher = PhraseMatcher(self.nlp.vocab, attr="LOWER")
+        self.canonical = {}  # normalized name -> name as listed in the vocabulary
+        for name in names:
+            key = normalize_name(name)
+            if len(key) >= MIN_NAME_LENGTH and key not in self.canonical:
+                self.canonical[key] = " ".join(name.split())
+        if self.canonical:
+            self.matcher.add("DRUG", list(self.nlp.tokenizer.pipe(self.canonical.values())))
+
+    def spans(self, text: str) -> list:
+        """Non-overlapping drug name matches in text, in order."""
+        from spacy.util import filter_spans
+
+        if not text or not self.canonical:
+            return []
+        doc = self.nlp.make_doc(text)
+        return sorted(filter_spans([doc[start:end] for _, start, end in self.matcher(doc)]), key=lambda s: s.start)
+
+    def names(self, spans) -> List[str]:
+        """The vocabulary names of matched spans, in order of first appearance, each once."""
+        found = {}
+        for span in spans:
+            key = normalize_name(span.text)
+            found.setdefault(key, self.canonical.get(key, span.text))
+        return list(found.values())
+
+    def find(self, text: str) -> List[str]:
+        """Drug names in text, in order of first appearance, each once."""
+        return self.names(self.spans(text))
+
+    def extract(self, medications: str, document_text: str = "") -> Tuple[List[str], float]:
+        """
+        Matches the medications field and the uploaded document text.
+
+        Returns:
+            tuple: The drug names found, and the confidence: the share of entries in the
+                medications field that contain a matched name (1.0 if the field is empty and
+                something was found in the documents, 0.0 if nothing was found).
+        """
+        medications = medications or ""
+        spans = self.spans(medications)
+        drugs = list(dict.fromkeys(self.names(spans) + self.find(document_text or "")))
+        if not drugs:
+            return [], 0.0
+        entries = medication_entries(medications)
+        if not entries:
+            return drugs, 1.0
+        # An entry counts when a whole matched phrase lies in it, not a substring of a word
+        recognised = sum(1 for start, end in entries
+                         if any(span.start_char < end and span.end_char > start for span in spans))
+        return drugs, recognised / len(entries)
+
+
+def medication_entries(medications: str) -> List[Tuple[int, int]]:
+    """(start, end) character offsets of the non-blank entries of a medications field."""
+    entries = []
+    start = 0
+    for separator in [*MEDICATION_SEPARATORS.finditer(medications), None]:
+        end = len(medications) if separator is None else separator.start()
+        if medications[start:end].strip():
+            entries.append((start, end))
+        if separator is not None:
+            start = separator.end()
+    return entries
+
+
+_extractor: Optional[DrugExtractor] = None
+_extractor_lock = threading.Lock()
+
+
+def get_extractor() -> DrugExtractor:
+    global _extractor
+    if _extractor is None:
+        with _extractor_lock:
+            if _extractor is None:
+                _extractor = DrugExtractor(load_vocabulary())
+    return _extractor
+
+
+def extract_drugs(medications: str, document_text: str = "") -> Tuple[List[str], float]:
+    return get_extractor().extract(medications, document_text)
@@ -0,0 +1,223 @@
+"""
+Morgan fingerprints of the interaction database's drugs, computed once and stored bit-packed.
+
+new.ipynb fingerprints both drugs of every row (millions of rows, a few
+hundred distinct molecules) and keeps one int8 array per row. Here each
+distinct SMILES is fingerprinted exactly once, on a process pool, and the
+fingerprints are saved np.packbits-packed, indexed by drug id:
+
+    bits   uint8 (max drug id + 1, n_bits / 8): row i is drug i; row 0 and unparsable drugs are all zeros
+    valid  bool  (max drug id + 1,): whether the drug's SMILES parsed
+
+The arrays are saved as .npy files and opened with mmap_mode="r", like the
+interaction_matrix snapshot. Training and inference pass arrays of drug ids;
+the rows of a batch are gathered straight from the mapping and unpacked
+only for that batch, so a pass over TWOSIDES never holds more than one
+batch of dense features. Build it once per database:
+
+    python fingerprint_store.py build --db raman.db --out raman.fingerprints
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import config
+
+N_BITS = 2048
+RADIUS = 2
+SMILES_PER_TASK = 256
+
+
+def morgan_fingerprint(smiles: str, radius: int = RADIUS, n_bits: int = N_BITS) -> Optional[np.ndarray]:
+    """The fingerprint of new.ipynb's generate_fingerprints as an int8 bit vector, or None for unparsable SMILES."""
+    from rdkit import Chem
+    from rdkit.Chem import AllChem, DataStructs
+
+    mol = Chem.MolFromSmiles(smiles)
+    if mol is None:
+        return None
+    fp = AllChem.GetMorganFingerprintAsBitVect(mol, radius, nBits=n_bits)
+    arr = np.zeros((n_bits,), dtype=np.int8)
+    DataStructs.ConvertToNumpyArray(fp, arr)
+    return arr
+
+
+def _packed_fingerprints(smiles: List[str], radius: int, n_bits: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Packed fingerprints of a chunk of SMILES and which of them parsed; runs in a pool process."""
+    from rdkit import RDLogger
+
+    RDLogger.DisableLog("rdApp.*")
+    bits = np.zeros((len(smiles), n_bits // 8), dtype=np.uint8)
+    valid = np.zeros(len(smiles), dtype=bool)
+    for i, s in enumerate(smiles):
+        fp = morgan_fingerprint(s, radius, n_bits)
+        if fp is not None:
+            bits[i] = np.packbits(fp)
+            valid[i] = True
+    return bits, valid
+
+
+class FingerprintStore:
+    def __init__(self, drugs: Dict[str, int], bits: np.ndarray, valid: np.ndarray, radius: int = RADIUS):
+        self.drug_ids = drugs
+        self.bits = bits
+        self.valid = valid
+        self.radius = radius
+        self.n_bits = bits.shape[1] * 8
+
+    @classmethod
+    def build(cls, drugs: Dict[str, int], radius: int = RADIUS, n_bits: int = N_BITS,
+              processes: int = os.cpu_count() or 1) -> "FingerprintStore":
+        """Fingerprints every drug once, SMILES_PER_TASK at a time on a process pool."""
+        size = max(drugs.values(), default=0) + 1
+        bits = np.zeros((size, n_bits // 8), dtype=np.uint8)
+        valid = np.zeros(size, dtype=bool)
+        items = sorted(drugs.items(), key=lambda item: item[1])
+        chunks = [items[i:i + SMILES_PER_TASK] for i in range(0, len(items), SMILES_PER_TASK)]
+        # spawn, not fork, as for the other process pools
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_packed_fingerprints, [s for s, _ in chunk], radius, n_bits) for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                ids = np.array([drug_id for _, drug_id in chunk], dtype=np.int64)
+                bits[ids], valid[ids] = future.result()
+        return cls(drugs, bits, valid, radius)
+
+    @classmethod
+    def from_db(cls, db_path: str = config.DATABASE_PATH, **kwargs) -> "FingerprintStore":
+        """Every drug of the database: its drugs table ids, or ids interned in SMILES order for a legacy raman table."""
+        conn = sqlite3.connect(db_path)
+        try:
+            if conn.execute("select 1 from sqlite_master where type = 'table' and name = 'interactions'").fetchone():
+                drugs = {smiles: drug_id for drug_id, smiles in conn.execute('''select id, smiles from drugs''')}
+            else:
+                drugs = {smiles: i for i, (smiles,) in enumerate(
+                    conn.execute('''select Drug1 from raman union select Drug2 from raman order by 1'''), start=1)}
+        finally:
+            conn.close()
+        return cls.build(drugs, **kwargs)
+
+    @classmethod
+    def load(cls, path: str = config.FINGERPRINT_STORE_PATH) -> "FingerprintStore":
+        with open(os.path.join(path, "drugs.json")) as f:
+            drugs = json.load(f)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        return cls(
+            drugs,
+            np.asarray(np.load(os.path.join(path, "bits.npy"), mmap_mode="r")),
+            np.asarray(np.load(os.path.join(path, "valid.npy"), mmap_mode="r")),
+            meta["radius"],
+        )
+
+    def save(self, path: str):
+        """Writes the store next to path and swaps it in, so running workers never see a partial file."""
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, "bits.npy"), np.ascontiguousarray(self.bits, dtype=np.uint8))
+        np.save(os.path.join(tmp_path, "valid.npy"), np.ascontiguousarray(self.valid, dtype=bool))
+        with open(os.path.join(tmp_path, "drugs.json"), "w") as f:
+            json.dump(self.drug_ids, f)
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump({"radius": self.radius, "n_bits": self.n_bits}, f)
+        old_path = f"{path}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    def ids(self, smiles: Iterable[str]) -> np.ndarray:
+        """Drug ids of many SMILES; 0 for SMILES not in the store."""
+        return np.array([self.drug_ids.get(s, 0) for s in smiles], dtype=np.int64)
+
+    def get(self, smiles: str) -> Optional[np.ndarray]:
+        """The unpacked fingerprint of one known, parsable drug as int8 bits, else None."""
+        drug_id = self.drug_ids.get(smiles, 0)
+        if not drug_id or not self.valid[drug_id]:
+            return None
+        return np.unpackbits(self.bits[drug_id]).astype(np.int8)
+
+    def unpacked(self, ids: np.ndarray) -> np.ndarray:
+        """(len(ids), n_bits) uint8 bits gathered from the packed rows."""
+        return np.unpackbits(self.bits[ids], axis=1)
+
+    def pair_features(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """float32 features of drug-id pairs: the summed fingerprints the interaction predictor takes."""
+        features = self.unpacked(a).astype(np.float32)
+        features += self.unpacked(b)
+        return features
+
+    def batches(self, a: np.ndarray, b: np.ndarray, *columns: np.ndarray,
+                batch_size: int = 4096) -> Iterator[Tuple[np.ndarray, ...]]:
+        """
+        Yields (features, *columns) per batch of pairs, e.g. columns=(labels,) for training;
+        torch.from_numpy() turns each array into a tensor without copying.
+        """
+        for start in range(0, len(a), batch_size):
+            end = start + batch_size
+            yield (self.pair_features(a[start:end], b[start:end]), *(column[start:end] for column in columns))
+
+    def training_pairs(self, db_path: str = config.DATABASE_PATH) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(drug id, drug id, Y) columns of every interaction in the database the store was built from."""
+        conn = sqlite3.connect(db_path)
+        try:
+            if conn.execute("select 1 from sqlite_master where type = 'table' and name = 'interactions'").fetchone():
+                rows = np.array(conn.execute('''select drug_a, drug_b, side_effect_id from interactions''').fetchall(),
+                                dtype=np.int64).reshape(-1, 3)
+            else:
+                drug_ids = self.drug_ids
+                rows = np.array([(drug_ids.get(a, 0), drug_ids.get(b, 0), int(y))
+                                 for a, b, y in conn.execute('''select Drug1, Drug2, Y from raman''')],
+                                dtype=np.int64).reshape(-1, 3)
+        finally:
+            conn.close()
+        return rows[:, 0], rows[:, 1], rows[:, 2]
+
+    def nbytes(self) -> int:
+        return self.bits.nbytes + self.valid.nbytes
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+_default_store_loaded = False
+
+
+def get_default_fingerprint_store() -> Optional[FingerprintStore]:
+    """The store at config.FINGERPRINT_STORE_PATH, or None if it has not been built."""
+    global _default_store, _default_store_loaded
+    if not _default_store_loaded:
+        with _default_store_lock:
+            if not _default_store_loaded:
+                if os.path.isdir(config.FINGERPRINT_STORE_PATH):
+                    _default_store = FingerprintStore.load(config.FINGERPRINT_STORE_PATH)
+                _default_store_loaded = True
+    return _default_store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fingerprint store maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Fingerprint every drug of the interaction database once")
+    build.add_argument("--db", default=config.DATABASE_PATH, help="Path to the interaction database")
+    build.add_argument("--out", default=config.FINGERPRINT_STORE_PATH, help="Store directory to write")
+    build.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    build.add_argument("--radius", type=int, default=RADIUS)
+    build.add_argument("--bits", type=int, default=N_BITS)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        store = FingerprintStore.from_db(args.db, radius=args.radius, n_bits=args.bits, processes=args.processes)
+        store.save(args.out)
+        print(f"Fingerprinted {len(store.drug_ids)} drugs ({int(store.valid.sum())} parsed) in "
+              f"{time.perf_counter() - start:.1f} s; {store.nbytes() / 1e6:.1f} MB written to {args.out}")
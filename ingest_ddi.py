@@ -0,0 +1,159 @@
+"""
+Builds the interaction database from the TDC DDI splits used in new.ipynb.
+
+Each SMILES is interned once into an integer `drugs` table and interactions
+are stored as (drug_a, drug_b, side_effect_id) integer triples with
+drug_a < drug_b, in a WITHOUT ROWID table keyed on the ordered pair. The
+side-effect names from get_label_map go into `side_effects`. A `raman` view
+keeps the old (Drug1, Drug2, Y) shape readable for existing scripts. Drug
+names and synonyms from an optional `name,smiles` CSV go into `drug_names`.
+
+    python ingest_ddi.py --name TWOSIDES --out raman.db --names drug_names.csv
+"""
+import argparse
+import csv
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
+
+import config
+
+BATCH_SIZE = 100_000
+
+
+def create_schema(conn: sqlite3.Connection):
+    conn.executescript('''
+        create table if not exists drugs (
+            id integer primary key,
+            smiles text not null unique
+        );
+        create table if not exists side_effects (
+            id integer primary key,
+            name text
+        );
+        create table if not exists interactions (
+            drug_a integer not null,
+            drug_b integer not null,
+            side_effect_id integer not null,
+            primary key (drug_a, drug_b, side_effect_id)
+        ) without rowid;
+        create table if not exists drug_names (
+            name text primary key collate nocase,
+            drug_id integer not null
+        ) without rowid;
+        create view if not exists raman as
+            select d1.smiles as Drug1, d2.smiles as Drug2, i.side_effect_id as Y
+            from interactions i
+            join drugs d1 on d1.id = i.drug_a
+            join drugs d2 on d2.id = i.drug_b;
+    ''')
+
+
+def ingest_rows(conn: sqlite3.Connection, rows: Iterable[Tuple[str, str, int]], batch_size: int = BATCH_SIZE) -> int:
+    """
+    Interns and stores (Drug1 SMILES, Drug2 SMILES, Y) rows.
+
+    Returns:
+        int: Number of rows read.
+    """
+    drug_ids: Dict[str, int] = dict(conn.execute('''select smiles, id from drugs'''))
+    new_drugs = []
+    triples = set()
+    count = 0
+
+    def intern(smiles: str) -> int:
+        drug_id = drug_ids.get(smiles)
+        if drug_id is None:
+            drug_id = drug_ids[smiles] = len(drug_ids) + 1
+            new_drugs.append((drug_id, smiles))
+        return drug_id
+
+    def flush():
+        conn.executemany('''insert into drugs (id, smiles) values (?, ?)''', new_drugs)
+        # Sorted inserts keep the clustered primary key b-tree append-mostly
+        conn.executemany('''insert or ignore into interactions (drug_a, drug_b, side_effect_id) values (?, ?, ?)''',
+                         sorted(triples))
+        new_drugs.clear()
+        triples.clear()
+
+    for drug1, drug2, y in rows:
+        a, b = intern(drug1), intern(drug2)
+        triples.add((min(a, b), max(a, b), int(y)))
+        count += 1
+        if len(triples) >= batch_size:
+            flush()
+    flush()
+    conn.commit()
+    return count
+
+
+def ingest_labels(conn: sqlite3.Connection, label_map: Dict[int, str]):
+    conn.executemany('''insert or replace into side_effects (id, name) values (?, ?)''',
+                     [(int(k), str(v)) for k, v in label_map.items()])
+    conn.commit()
+
+
+def ingest_names(conn: sqlite3.Connection, rows: Iterable[Tuple[str, str]]) -> int:
+    """Stores (name, SMILES) synonyms; SMILES not seen in the interactions are interned too."""
+    drug_ids: Dict[str, int] = dict(conn.execute('''select smiles, id from drugs'''))
+    new_drugs = []
+    names = []
+    for name, smiles in rows:
+        name = " ".join(name.split())
+        if not name or not smiles:
+            continue
+        drug_id = drug_ids.get(smiles)
+        if drug_id is None:
+            drug_id = drug_ids[smiles] = len(drug_ids) + 1
+            new_drugs.append((drug_id, smiles))
+        names.append((name, drug_id))
+    conn.executemany('''insert into drugs (id, smiles) values (?, ?)''', new_drugs)
+    conn.executemany('''insert or replace into drug_names (name, drug_id) values (?, ?)''', names)
+    conn.commit()
+    return len(names)
+
+
+def build_from_tdc(out_path: str = config.DATABASE_PATH, name: str = "TWOSIDES",
+                   splits: Tuple[str, ...] = ("train", "valid", "test"), label_column: Optional[str] = None,
+                   names_path: Optional[str] = None) -> int:
+    from tdc.multi_pred import DDI
+    from tdc.utils import get_label_map
+
+    if label_column is None and name == "TWOSIDES":
+        label_column = "Side Effect Name"
+    split = DDI(name=name).get_split()
+
+    conn = sqlite3.connect(out_path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        create_schema(conn)
+        count = 0
+        for split_name in splits:
+            frame = split[split_name]
+            count += ingest_rows(conn, zip(frame["Drug1"], frame["Drug2"], frame["Y"]))
+            print(f"Ingested {split_name}: {len(frame)} rows")
+        if label_column:
+            label_map = get_label_map(name=name, task="DDI", name_column=label_column)
+        else:
+            label_map = get_label_map(name=name, task="DDI")
+        ingest_labels(conn, label_map)
+        if names_path:
+            with open(names_path, newline="") as f:
+                n_names = ingest_names(conn, ((row["name"], row["smiles"]) for row in csv.DictReader(f)))
+            print(f"Ingested {n_names} drug names")
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the interaction database from TDC DDI data")
+    parser.add_argument("--name", default="TWOSIDES", help="TDC DDI dataset name (TWOSIDES or DrugBank)")
+    parser.add_argument("--out", default=config.DATABASE_PATH, help="Path of the database to build")
+    parser.add_argument("--names", default=None, help="Optional CSV file with name,smiles columns")
+    args = parser.parse_args()
+    n = build_from_tdc(args.out, name=args.name, names_path=args.names)
+    print(f"Wrote {n} interactions to {args.out}")
@@ -0,0 +1,177 @@
+"""
+In-memory interaction engine backed by a memory-mapped snapshot.
+
+The whole interaction dataset is laid out CSR-style in NumPy arrays:
+
+    keys     int64, sorted: drug_a * n_drugs + drug_b for every pair (drug_a < drug_b)
+    offsets  int64, len(keys) + 1: side effects of keys[i] are values[offsets[i]:offsets[i + 1]]
+    values   int32: side-effect label ids
+
+The arrays are saved as .npy files and opened with mmap_mode="r", so every
+uvicorn worker shares one physical copy through the page cache and startup is
+just an mmap. Pair lookups are a vectorised searchsorted over keys.
+
+Enable it with INTERACTION_ENGINE=matrix after writing a snapshot:
+
+    python interaction_matrix.py build --db raman.db --out raman.snapshot
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+import config
+import metrics
+
+
+class InteractionMatrix:
+    def __init__(self, drugs: Dict[str, int], keys: np.ndarray, offsets: np.ndarray, values: np.ndarray,
+                 labels: Dict[int, str] = None):
+        self.drug_ids = drugs
+        self.n_drugs = len(drugs) + 1  # ids start at 1
+        self.keys = keys
+        self.offsets = offsets
+        self.values = values
+        self.labels = labels or {}
+
+    @classmethod
+    def load(cls, path: str = config.INTERACTION_SNAPSHOT_PATH) -> "InteractionMatrix":
+        with open(os.path.join(path, "drugs.json")) as f:
+            drugs = json.load(f)
+        with open(os.path.join(path, "labels.json")) as f:
+            labels = {int(k): v for k, v in json.load(f).items()}
+        # Plain ndarray views over the mapping skip np.memmap's per-index overhead
+        return cls(
+            drugs,
+            np.asarray(np.load(os.path.join(path, "keys.npy"), mmap_mode="r")),
+            np.asarray(np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")),
+            np.asarray(np.load(os.path.join(path, "values.npy"), mmap_mode="r")),
+            labels,
+        )
+
+    def save(self, path: str):
+        """Writes the snapshot next to path and swaps it in, so running workers never see a partial file."""
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, "keys.npy"), np.ascontiguousarray(self.keys, dtype=np.int64))
+        np.save(os.path.join(tmp_path, "offsets.npy"), np.ascontiguousarray(self.offsets, dtype=np.int64))
+        np.save(os.path.join(tmp_path, "values.npy"), np.ascontiguousarray(self.values, dtype=np.int32))
+        with open(os.path.join(tmp_path, "drugs.json"), "w") as f:
+            json.dump(self.drug_ids, f)
+        with open(os.path.join(tmp_path, "labels.json"), "w") as f:
+            json.dump({str(k): v for k, v in self.labels.items()}, f)
+        old_path = f"{path}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @classmethod
+    def from_triples(cls, drugs: Dict[str, int], a: np.ndarray, b: np.ndarray, y: np.ndarray,
+                     labels: Dict[int, str] = None) -> "InteractionMatrix":
+        """Builds the CSR arrays from (drug id, drug id, side effect id) columns in any order or orientation."""
+        a, b = np.minimum(a, b).astype(np.int64), np.maximum(a, b).astype(np.int64)
+        n_drugs = len(drugs) + 1
+        pair_keys = a * n_drugs + b
+        order = np.lexsort((y, pair_keys))
+        pair_keys, y = pair_keys[order], y[order]
+        # Drop duplicate (pair, side effect) rows, e.g. both orientations of a pair
+        keep = np.ones(len(pair_keys), dtype=bool)
+        keep[1:] = (pair_keys[1:] != pair_keys[:-1]) | (y[1:] != y[:-1])
+        pair_keys, y = pair_keys[keep], y[keep]
+        keys, starts = np.unique(pair_keys, return_index=True)
+        offsets = np.append(starts, len(pair_keys)).astype(np.int64)
+        return cls(drugs, keys, offsets, y.astype(np.int32), labels)
+
+    @classmethod
+    def from_db(cls, db_path: str = config.DATABASE_PATH) -> "InteractionMatrix":
+        conn = sqlite3.connect(db_path)
+        try:
+            if conn.execute("select 1 from sqlite_master where type = 'table' and name = 'interactions'").fetchone():
+                drugs = {smiles: drug_id for drug_id, smiles in conn.execute('''select id, smiles from drugs''')}
+                rows = np.array(conn.execute('''select drug_a, drug_b, side_effect_id from interactions''').fetchall(),
+                                dtype=np.int64).reshape(-1, 3)
+                labels = dict(conn.execute('''select id, name from side_effects'''))
+            else:
+                # Legacy raman table: intern the SMILES on the fly, ids dense from 1
+                drugs = {}
+                triples = []
+                for drug1, drug2, y in conn.execute('''select Drug1, Drug2, Y from raman'''):
+                    a = drugs.setdefault(drug1, len(drugs) + 1)
+                    b = drugs.setdefault(drug2, len(drugs) + 1)
+                    triples.append((a, b, int(y)))
+                rows = np.array(triples, dtype=np.int64).reshape(-1, 3)
+                labels = {}
+        finally:
+            conn.close()
+        if drugs and max(drugs.values()) != len(drugs):
+            # Keep ids dense so the pair key space stays n_drugs ** 2
+            remap = np.zeros(max(drugs.values()) + 1, dtype=np.int64)
+            ordered = sorted(drugs.items(), key=lambda item: item[1])
+            for new_id, (_, old_id) in enumerate(ordered, start=1):
+                remap[old_id] = new_id
+            drugs = {smiles: new_id for new_id, (smiles, _) in enumerate(ordered, start=1)}
+            rows[:, 0], rows[:, 1] = remap[rows[:, 0]], remap[rows[:, 1]]
+        return cls.from_triples(drugs, rows[:, 0], rows[:, 1], rows[:, 2], labels)
+
+    def lookup_pairs(self, pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], List[int]]:
+        """
+        Finds the side effects of many drug pairs, in either orientation.
+
+        Args:
+            pairs: (SMILES, SMILES) tuples.
+
+        Returns:
+            dict: Maps each input pair to the side-effect labels found for it (possibly empty).
+        """
+        with metrics.span("db_query"):
+            return self._lookup_pairs(pairs)
+
+    def _lookup_pairs(self, pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], List[int]]:
+        pairs = list(dict.fromkeys(tuple(p) for p in pairs))
+        results = {pair: [] for pair in pairs}
+        if not pairs or not len(self.keys):
+            return results
+        ids = np.array([(self.drug_ids.get(a, 0), self.drug_ids.get(b, 0)) for a, b in pairs], dtype=np.int64)
+        lo, hi = ids.min(axis=1), ids.max(axis=1)
+        query = lo * self.n_drugs + hi
+        idx = np.searchsorted(self.keys, query)
+        idx_clipped = np.minimum(idx, len(self.keys) - 1)
+        found = (lo > 0) & (self.keys[idx_clipped] == query)
+        hits = np.flatnonzero(found)
+        k = idx_clipped[hits]
+        starts, lengths = self.offsets[k], self.offsets[k + 1] - self.offsets[k]
+        # One gather for all hit pairs instead of a slice per pair
+        gather = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        values = self.values[gather].tolist()
+        position = 0
+        for i, length in zip(hits.tolist(), lengths.tolist()):
+            results[pairs[i]] = values[position:position + length]
+            position += length
+        return results
+
+    def side_effect_names(self, ids: Iterable[int]) -> Dict[int, str]:
+        return {i: self.labels[i] for i in ids if i in self.labels}
+
+    def close(self):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interaction matrix snapshot maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Write a memory-mapped snapshot of the interaction database")
+    build.add_argument("--db", default=config.DATABASE_PATH, help="Path to the interaction database")
+    build.add_argument("--out", default=config.INTERACTION_SNAPSHOT_PATH, help="Snapshot directory to write")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        matrix = InteractionMatrix.from_db(args.db)
+        matrix.save(args.out)
+        print(f"Wrote {len(matrix.keys)} pairs / {len(matrix.values)} interactions to {args.out}")
@@ -0,0 +1,235 @@
+"""
+Side-effect prediction for drug pairs that are not in the interaction database.
+
+This is the node_classifier from new.ipynb (2048 -> 128 -> ReLU -> n labels)
+run for inference in NumPy, so serving needs neither PyTorch nor a GPU. A
+pair is featurized as the sum of the two drugs' Morgan fingerprints (radius 2,
+2048 bits), which does not depend on the order of the pair. Database drugs
+are read from the fingerprint store when one has been built. All unknown pairs
+of a patient go through one batched forward pass, and the top side effects
+above config.PREDICTOR_MIN_PROBABILITY are returned with their softmax
+probabilities.
+
+The weights are a .npz with fc1.weight, fc1.bias, fc2.weight, fc2.bias and an
+optional labels array mapping output columns to side-effect ids (default:
+column i is label i). Export them from a trained PyTorch model with
+
+    python interaction_predictor.py export --state-dict model.pt --out predictor.npz
+
+and measure throughput with
+
+    python interaction_predictor.py bench --pairs 1000
+"""
+import argparse
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import config
+import metrics
+from fingerprint_store import N_BITS, RADIUS, FingerprintStore, get_default_fingerprint_store, morgan_fingerprint
+
+FINGERPRINT_CACHE_SIZE = 4096
+
+
+class InteractionPredictor:
+    def __init__(self, fc1_weight: np.ndarray, fc1_bias: np.ndarray, fc2_weight: np.ndarray, fc2_bias: np.ndarray,
+                 labels: Optional[np.ndarray] = None, side_effect_names: Optional[Dict[int, str]] = None,
+                 feature_store: Optional[FingerprintStore] = None):
+        # Stored transposed so the forward pass is x @ W1 + b1
+        self.w1 = np.ascontiguousarray(fc1_weight.T, dtype=np.float32)
+        self.b1 = fc1_bias.astype(np.float32)
+        self.w2 = np.ascontiguousarray(fc2_weight.T, dtype=np.float32)
+        self.b2 = fc2_bias.astype(np.float32)
+        self.labels = np.arange(self.w2.shape[1]) if labels is None else np.asarray(labels, dtype=np.int64)
+        self.side_effect_names = side_effect_names or {}
+        if feature_store is not None and (feature_store.n_bits != self.w1.shape[0] or feature_store.radius != RADIUS):
+            raise ValueError(f"Fingerprint store has {feature_store.n_bits} bits of radius {feature_store.radius}, "
+                             f"the model takes {self.w1.shape[0]} of radius {RADIUS}")
+        self.feature_store = feature_store
+        self._fingerprints = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=config.PREDICTOR_WORKERS, thread_name_prefix="fingerprint")
+        self.pairs_scored = 0
+        self.seconds = 0.0
+
+    @classmethod
+    def load(cls, path: str, side_effect_names: Optional[Dict[int, str]] = None,
+             feature_store: Optional[FingerprintStore] = None) -> "InteractionPredictor":
+        weights = np.load(path)
+        return cls(weights["fc1.weight"], weights["fc1.bias"], weights["fc2.weight"], weights["fc2.bias"],
+                   weights["labels"] if "labels" in weights.files else None, side_effect_names, feature_store)
+
+    def fingerprints(self, smiles: Iterable[str]) -> Dict[str, Optional[np.ndarray]]:
+        """
+        Fingerprints of many SMILES: database drugs from the fingerprint store, others
+        computed in parallel (RDKit releases the GIL) and kept in an LRU.
+        """
+        smiles = list(dict.fromkeys(smiles))
+        with self._lock:
+            found = {s: self._fingerprints[s] for s in smiles if s in self._fingerprints}
+        if self.feature_store is not None:
+            for s in smiles:
+                if s not in found and s in self.feature_store.drug_ids:
+                    found[s] = self.feature_store.get(s)
+        missing = [s for s in smiles if s not in found]
+        if missing:
+            computed = dict(zip(missing, self._executor.map(morgan_fingerprint, missing)))
+            found.update(computed)
+            with self._lock:
+                for s, fp in computed.items():
+                    self._fingerprints[s] = fp
+                    self._fingerprints.move_to_end(s)
+                while len(self._fingerprints) > FINGERPRINT_CACHE_SIZE:
+                    self._fingerprints.popitem(last=False)
+        return found
+
+    def featurize(self, pairs: List[Tuple[str, str]]) -> Tuple[np.ndarray, List[Tuple[str, str]]]:
+        """One float32 row per pair whose two SMILES both parse, and those pairs."""
+        fps = self.fingerprints(s for pair in pairs for s in pair)
+        valid = [(a, b) for a, b in pairs if fps[a] is not None and fps[b] is not None]
+        if not valid:
+            return np.zeros((0, self.w1.shape[0]), dtype=np.float32), []
+        a = np.stack([fps[a] for a, _ in valid])
+        b = np.stack([fps[b] for _, b in valid])
+        return (a + b).astype(np.float32), valid
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """Softmax over the side-effect labels; dropout is the identity at inference."""
+        hidden = np.maximum(features @ self.w1 + self.b1, 0)
+        logits = hidden @ self.w2 + self.b2
+        logits -= logits.max(axis=1, keepdims=True)
+        np.exp(logits, out=logits)
+        logits /= logits.sum(axis=1, keepdims=True)
+        return logits
+
+    def predict_pairs(self, pairs: Iterable[Tuple[str, str]], top_k: int = config.PREDICTOR_TOP_K,
+                      min_probability: float = config.PREDICTOR_MIN_PROBABILITY) -> Dict[Tuple[str, str], List[Tuple[int, float]]]:
+        """
+        Predicts the most likely side effects of many drug pairs in one forward pass.
+
+        Returns:
+            dict: Maps each pair whose SMILES parse to up to top_k (side-effect id, probability)
+                tuples, most likely first.
+        """
+        pairs = list(dict.fromkeys(tuple(p) for p in pairs))
+        if not pairs:
+            return {}
+        start = time.perf_counter()
+        with metrics.span("predictor"):
+            features, valid = self.featurize(pairs)
+            if not valid:
+                return {}
+            probabilities = self.predict_proba(features)
+            k = min(top_k, probabilities.shape[1])
+            top = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
+            top_p = np.take_along_axis(probabilities, top, axis=1)
+            order = np.argsort(-top_p, axis=1)
+            top, top_p = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_p, order, axis=1)
+        results = {}
+        for pair, columns, ps in zip(valid, top.tolist(), top_p.tolist()):
+            results[pair] = [(int(self.labels[c]), p) for c, p in zip(columns, ps) if p >= min_probability]
+        with self._lock:
+            self.pairs_scored += len(valid)
+            self.seconds += time.perf_counter() - start
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pairs_scored": self.pairs_scored,
+                "seconds": self.seconds,
+                "pairs_per_sec": self.pairs_scored / self.seconds if self.seconds else 0.0,
+                "fingerprints_cached": len(self._fingerprints),
+            }
+
+
+_default_predictor = None
+_default_predictor_lock = threading.Lock()
+_default_predictor_loaded = False
+
+
+def get_default_predictor() -> Optional[InteractionPredictor]:
+    """The process-wide predictor, or None when config.PREDICTOR_WEIGHTS_PATH is unset or cannot be loaded."""
+    global _default_predictor, _default_predictor_loaded
+    if not _default_predictor_loaded:
+        with _default_predictor_lock:
+            if not _default_predictor_loaded:
+                if config.PREDICTOR_WEIGHTS_PATH:
+                    from interaction_store import get_default_store
+                    try:
+                        store = get_default_store()
+                        predictor = InteractionPredictor.load(config.PREDICTOR_WEIGHTS_PATH,
+                                                              feature_store=get_default_fingerprint_store())
+                        predictor.side_effect_names = store.side_effect_names(predictor.labels.tolist())
+                        _default_predictor = predictor
+                    except Exception as e:
+                        print(f"Interaction predictor disabled, could not load {config.PREDICTOR_WEIGHTS_PATH}: {e}")
+                _default_predictor_loaded = True
+    return _default_predictor
+
+
+def export_state_dict(state_dict_path: str, out_path: str, db_path: Optional[str] = config.DATABASE_PATH):
+    """
+    Converts a PyTorch node_classifier state_dict to the .npz the predictor loads.
+
+    The notebook trains on the sorted distinct Y values of the database as
+    classes, so the labels are read back from the same database.
+    """
+    import sqlite3
+
+    import torch
+
+    state = torch.load(state_dict_path, map_location="cpu")
+    arrays = {name: tensor.detach().cpu().numpy() for name, tensor in state.items()}
+    if db_path:
+        conn = sqlite3.connect(db_path)
+        arrays["labels"] = np.array([y for (y,) in conn.execute('''select distinct Y from raman order by Y''')], dtype=np.int64)
+        conn.close()
+    np.savez(out_path, **arrays)
+
+
+def random_predictor(n_labels: int = 1317, hidden: int = 128, seed: int = 0) -> InteractionPredictor:
+    """Untrained weights of the right shapes, for benchmarking."""
+    rng = np.random.default_rng(seed)
+    return InteractionPredictor(rng.normal(0, 0.02, (hidden, N_BITS)), np.zeros(hidden),
+                                rng.normal(0, 0.02, (n_labels, hidden)), np.zeros(n_labels))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interaction predictor maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="Convert a trained PyTorch state_dict to predictor weights")
+    export.add_argument("--state-dict", required=True, help="torch.save(model.state_dict()) file")
+    export.add_argument("--db", default=config.DATABASE_PATH, help="Database the model was trained on, for the label order")
+    export.add_argument("--out", default=config.PREDICTOR_WEIGHTS_PATH or "predictor.npz")
+    bench = subparsers.add_parser("bench", help="Report pairs/sec of featurization plus inference")
+    bench.add_argument("--weights", default=config.PREDICTOR_WEIGHTS_PATH, help="Predictor weights; untrained if unset")
+    bench.add_argument("--pairs", type=int, default=1000)
+    bench.add_argument("--db", default=config.DATABASE_PATH, help="Database the drug SMILES are sampled from")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_state_dict(args.state_dict, args.out, args.db)
+        print(f"Wrote {args.out}")
+    elif args.command == "bench":
+        import random
+        import sqlite3
+
+        predictor = InteractionPredictor.load(args.weights) if args.weights else random_predictor()
+        conn = sqlite3.connect(args.db)
+        drugs = [s for (s,) in conn.execute('''select Drug1 from raman union select Drug2 from raman''')]
+        conn.close()
+        rng = random.Random(0)
+        pairs = [tuple(rng.sample(drugs, 2)) for _ in range(args.pairs)]
+        # The first pass computes the fingerprints, the second finds them cached
+        for label in ("cold fingerprints", "cached fingerprints"):
+            start = time.perf_counter()
+            predictor.predict_pairs(pairs)
+            elapsed = time.perf_counter() - start
+            print(f"{label:>20}: {len(pairs) / elapsed:,.0f} pairs/sec ({len(pairs)} pairs in {elapsed * 1000:.1f} ms)")
+        print(predictor.stats())
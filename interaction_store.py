@@ -0,0 +1,155 @@
+"""
+Drug-pair interaction lookups against the raman database.
+
+A small pool of long-lived read-only connections serves batched,
+order-insensitive lookups: all pairs of a patient are answered by a single
+query joining a VALUES list against the covering (Drug1, Drug2, Y) index,
+or against the integer interactions table when the database was built by
+ingest_ddi.py.
+
+Build the index once per database:
+
+    python interaction_store.py migrate --db raman.db
+"""
+import argparse
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+import config
+import metrics
+
+POOL_SIZE = 4
+MMAP_SIZE = 256 * 1024 * 1024
+# Stay well below SQLITE_MAX_VARIABLE_NUMBER on older SQLite builds (999)
+PAIRS_PER_QUERY = 400
+
+
+# Legacy schema: raman(Drug1, Drug2, Y) keyed on SMILES strings
+LEGACY_QUERY = '''with pairs(a, b) as (values {values})
+                  select a, b, Y from pairs join raman on Drug1 = a and Drug2 = b
+                  union
+                  select a, b, Y from pairs join raman on Drug1 = b and Drug2 = a'''
+
+# Compact schema from ingest_ddi.py: interned drug ids, drug_a < drug_b
+COMPACT_QUERY = '''with pairs(a, b) as (values {values})
+                   select a, b, i.side_effect_id from pairs
+                   join drugs d1 on d1.smiles = a
+                   join drugs d2 on d2.smiles = b
+                   join interactions i on i.drug_a = min(d1.id, d2.id) and i.drug_b = max(d1.id, d2.id)'''
+
+
+def is_compact(conn: sqlite3.Connection) -> bool:
+    return conn.execute("select 1 from sqlite_master where type = 'table' and name = 'interactions'").fetchone() is not None
+
+
+def migrate(db_path: str = config.DATABASE_PATH):
+    """Switches the database to WAL and builds the covering pair index."""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        if not is_compact(conn):
+            conn.execute('''create index if not exists idx_raman_pair on raman (Drug1, Drug2, Y)''')
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class InteractionStore:
+    def __init__(self, db_path: str = config.DATABASE_PATH, pool_size: int = POOL_SIZE):
+        self.db_path = db_path
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+        with self.connection() as conn:
+            self.compact = is_compact(conn)
+        self._query = COMPACT_QUERY if self.compact else LEGACY_QUERY
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only=1")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute("PRAGMA cache_size=-65536")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def lookup_pairs(self, pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], List[int]]:
+        """
+        Finds the side effects of many drug pairs, in either orientation.
+
+        Args:
+            pairs: (SMILES, SMILES) tuples.
+
+        Returns:
+            dict: Maps each input pair to the side-effect labels found for it (possibly empty).
+        """
+        pairs = list(dict.fromkeys(tuple(p) for p in pairs))
+        results = {pair: [] for pair in pairs}
+        with self.connection() as conn, metrics.span("db_query"):
+            for start in range(0, len(pairs), PAIRS_PER_QUERY):
+                chunk = pairs[start:start + PAIRS_PER_QUERY]
+                values = ", ".join(["(?, ?)"] * len(chunk))
+                params = [smiles for pair in chunk for smiles in pair]
+                for a, b, y in conn.execute(self._query.format(values=values), params):
+                    results[(a, b)].append(y)
+        return results
+
+    def side_effect_names(self, ids: Iterable[int]) -> Dict[int, str]:
+        """Maps side-effect label ids to names; empty for databases without a side_effects table."""
+        ids = list(dict.fromkeys(ids))
+        if not self.compact or not ids:
+            return {}
+        names = {}
+        with self.connection() as conn:
+            for start in range(0, len(ids), PAIRS_PER_QUERY):
+                chunk = ids[start:start + PAIRS_PER_QUERY]
+                placeholders = ", ".join(["?"] * len(chunk))
+                names.update(conn.execute(f'''select id, name from side_effects where id in ({placeholders})''', chunk))
+        return names
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store():
+    """
+    Returns the process-wide interaction engine selected by INTERACTION_ENGINE:
+    the SQLite store, or the memory-mapped InteractionMatrix snapshot.
+    """
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                if config.INTERACTION_ENGINE == "matrix":
+                    from interaction_matrix import InteractionMatrix
+                    _default_store = InteractionMatrix.load(config.INTERACTION_SNAPSHOT_PATH)
+                else:
+                    _default_store = InteractionStore()
+    return _default_store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interaction database maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="Build the covering pair index")
+    migrate_parser.add_argument("--db", default=config.DATABASE_PATH, help="Path to the interaction database")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate(args.db)
+        print(f"Migrated {args.db}")
@@ -0,0 +1,249 @@
+"""
+Persistent job queue for analyses that outlive an HTTP request.
+
+POST /process-patient-data/jobs stores the form and its uploads in a SQLite
+job table and returns a job id straight away; worker processes claim queued
+jobs, run the full analysis and write the result back, and clients poll the
+status and result endpoints. Workers are separate processes, so they use
+their own cores and can be scaled independently of uvicorn: the API starts
+config.JOB_WORKERS of them, and more can run on their own with
+
+    python jobs.py worker --processes 4
+
+A job left "running" by a worker that died is queued again once it has been
+running for longer than config.JOB_STALE_AFTER seconds.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+import config
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobStore:
+    def __init__(self, path: str = config.JOB_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript('''create table if not exists jobs (
+                                  id text primary key,
+                                  state text not null,
+                                  fields text not null,
+                                  session_id text,
+                                  response_key text,
+                                  result text,
+                                  error text,
+                                  worker text,
+                                  attempts integer not null default 0,
+                                  created_at real not null,
+                                  started_at real,
+                                  finished_at real
+                              );
+                              create index if not exists idx_jobs_queue on jobs (state, created_at);
+                              create table if not exists job_documents (
+                                  job_id text not null,
+                                  position integer not null,
+                                  filename text not null,
+                                  digest text not null,
+                                  data blob not null,
+                                  primary key (job_id, position)
+                              ) without rowid;''')
+        if "session_id" not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}:
+            conn.execute('''alter table jobs add column session_id text''')
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; a busy timeout lets API and workers share the file
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, fields: dict, documents: List[Tuple[str, str, bytes]] = (), response_key: Optional[str] = None,
+               result=None, session_id: Optional[str] = None) -> str:
+        """
+        Queues a job, or records it as done straight away when result is given (e.g. a response cache hit).
+
+        Args:
+            documents: (filename, SHA-256, bytes) per upload, in upload order.
+            session_id: The returning patient's session, analysed incrementally like on /process-patient-data/.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._conn()
+        conn.execute("begin immediate")
+        try:
+            if result is None:
+                conn.execute('''insert into jobs (id, state, fields, session_id, response_key, created_at) values (?, ?, ?, ?, ?, ?)''',
+                             (job_id, QUEUED, json.dumps(fields), session_id, response_key, now))
+            else:
+                conn.execute('''insert into jobs (id, state, fields, session_id, response_key, result, created_at, finished_at)
+                                values (?, ?, ?, ?, ?, ?, ?, ?)''',
+                             (job_id, DONE, json.dumps(fields), session_id, response_key, json.dumps(result), now, now))
+            conn.executemany('''insert into job_documents (job_id, position, filename, digest, data) values (?, ?, ?, ?, ?)''',
+                             [(job_id, i, filename, digest, data) for i, (filename, digest, data) in enumerate(documents)])
+            conn.execute("commit")
+        except BaseException:
+            conn.execute("rollback")
+            raise
+        return job_id
+
+    def claim(self, worker: str) -> Optional[dict]:
+        """Takes the oldest queued job, marking it running; None when the queue is empty."""
+        conn = self._conn()
+        conn.execute("begin immediate")
+        try:
+            row = conn.execute('''select id, fields, response_key, session_id from jobs where state = ? order by created_at limit 1''',
+                               (QUEUED,)).fetchone()
+            if row is not None:
+                conn.execute('''update jobs set state = ?, worker = ?, started_at = ?, attempts = attempts + 1 where id = ?''',
+                             (RUNNING, worker, time.time(), row[0]))
+            conn.execute("commit")
+        except BaseException:
+            conn.execute("rollback")
+            raise
+        if row is None:
+            return None
+        documents = conn.execute('''select filename, digest, data from job_documents where job_id = ? order by position''',
+                                 (row[0],)).fetchall()
+        return {"id": row[0], "fields": json.loads(row[1]), "response_key": row[2], "session_id": row[3], "documents": documents}
+
+    def finish(self, job_id: str, result=None, error: Optional[str] = None):
+        conn = self._conn()
+        conn.execute("begin immediate")
+        try:
+            conn.execute('''update jobs set state = ?, result = ?, error = ?, finished_at = ? where id = ?''',
+                         (FAILED if error else DONE, None if error else json.dumps(result), error, time.time(), job_id))
+            conn.execute('''delete from job_documents where job_id = ?''', (job_id,))
+            conn.execute("commit")
+        except BaseException:
+            conn.execute("rollback")
+            raise
+
+    def requeue_stale(self, older_than: float = config.JOB_STALE_AFTER, max_attempts: int = config.JOB_MAX_ATTEMPTS) -> int:
+        """Queues running jobs whose worker has gone quiet again; past max_attempts they fail instead."""
+        cutoff = time.time() - older_than
+        conn = self._conn()
+        conn.execute("begin immediate")
+        try:
+            conn.execute('''update jobs set state = ?, error = 'Worker stopped responding', finished_at = ?
+                            where state = ? and started_at < ? and attempts >= ?''', (FAILED, time.time(), RUNNING, cutoff, max_attempts))
+            n = conn.execute('''update jobs set state = ?, worker = null where state = ? and started_at < ?''',
+                             (QUEUED, RUNNING, cutoff)).rowcount
+            conn.execute("commit")
+        except BaseException:
+            conn.execute("rollback")
+            raise
+        return n
+
+    def status(self, job_id: str) -> Optional[dict]:
+        row = self._conn().execute('''select state, error, created_at, started_at, finished_at, attempts from jobs where id = ?''',
+                                   (job_id,)).fetchone()
+        if row is None:
+            return None
+        state, error, created_at, started_at, finished_at, attempts = row
+        status = {"job_id": job_id, "state": state, "created_at": created_at, "started_at": started_at,
+                  "finished_at": finished_at, "attempts": attempts}
+        if state == QUEUED:
+            status["queue_position"] = self._conn().execute('''select count(*) from jobs where state = ? and created_at <= ?''',
+                                                            (QUEUED, created_at)).fetchone()[0]
+        if error:
+            status["error"] = error
+        return status
+
+    def result(self, job_id: str):
+        row = self._conn().execute('''select result from jobs where id = ?''', (job_id,)).fetchone()
+        return None if row is None or row[0] is None else json.loads(row[0])
+
+    def counts(self) -> dict:
+        return dict(self._conn().execute('''select state, count(*) from jobs group by state''').fetchall())
+
+
+def run_worker(path: str = config.JOB_DB_PATH, poll_interval: float = config.JOB_POLL_INTERVAL):
+    """Claims and runs jobs until the process is stopped."""
+    import patient_help_api
+    from agent_registry import init_registry
+    from response_cache import get_response_cache
+
+    # One job at a time per process, so one agent per role is enough
+    init_registry(patient_help_api.agent_specs(), pool_size=1)
+    store = JobStore(path)
+    worker = f"{os.uname().nodename}:{os.getpid()}"
+    last_sweep = 0.0
+    while True:
+        if time.time() - last_sweep > poll_interval * 10:
+            store.requeue_stale()
+            last_sweep = time.time()
+        job = store.claim(worker)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        try:
+            output = patient_help_api.run_analysis(job["documents"], job["fields"], job["session_id"])
+        except Exception as e:
+            store.finish(job["id"], error=str(e))
+            continue
+        store.finish(job["id"], result=output)
+        if output is not None and job["response_key"]:
+            get_response_cache().put(job["response_key"], output)
+
+
+def start_workers(n: int = config.JOB_WORKERS, path: str = config.JOB_DB_PATH) -> List[multiprocessing.Process]:
+    # spawn, not fork: the API process is multi-threaded
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for i in range(n):
+        process = context.Process(target=run_worker, args=(path,), name=f"job-worker-{i}", daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def stop_workers(processes: List[multiprocessing.Process]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(timeout=10)
+
+
+_default_store: Optional[JobStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = JobStore()
+    return _default_store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analysis job queue")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    worker_parser = subparsers.add_parser("worker", help="Run worker processes against the job table")
+    worker_parser.add_argument("--processes", type=int, default=1)
+    worker_parser.add_argument("--db", default=config.JOB_DB_PATH, help="Path to the job database")
+    subparsers.add_parser("stats", help="Print job counts by state").add_argument("--db", default=config.JOB_DB_PATH)
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        if args.processes == 1:
+            run_worker(args.db)
+        else:
+            for process in start_workers(args.processes, args.db):
+                process.join()
+    elif args.command == "stats":
+        print(JobStore(args.db).counts())
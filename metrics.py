@@ -0,0 +1,138 @@
+"""
+Latency and usage metrics, exported in the Prometheus text format on /metrics.
+
+span() times a block into the mlhks_stage_seconds histogram under a stage
+label (upload_read, documents, extraction, interactions, summary, one per
+agent role, pubchem_lookup, db_query, similarity_search, predictor). When a request is being traced, the
+same spans are also collected into a per-request Trace and returned in a
+Server-Timing header, so a slow request shows where its time went.
+
+Cache hit rates are read from the caches' own counters at scrape time.
+Metrics are per process: job worker processes (jobs.py) are not included.
+"""
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Sub-millisecond cache hits up to multi-minute agent runs
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram("mlhks_stage_seconds", "Time spent in one stage of an analysis", ["stage"], buckets=BUCKETS)
+STAGE_ERRORS = Counter("mlhks_stage_errors_total", "Stages that raised", ["stage"])
+REQUEST_SECONDS = Histogram("mlhks_request_seconds", "HTTP request latency", ["method", "route", "status"], buckets=BUCKETS)
+REQUESTS_IN_FLIGHT = Gauge("mlhks_http_requests_in_flight", "HTTP requests being served")
+ANALYSES_IN_FLIGHT = Gauge("mlhks_analyses_in_flight", "Analyses admitted and not yet finished")
+LLM_TOKENS = Counter("mlhks_llm_tokens_total", "LLM tokens used by the agents", ["role", "direction"])
+CACHE_LOOKUPS = Counter("mlhks_cache_lookups_total", "Lookups in caches without their own counters", ["cache", "result"])
+CRITICAL_PATH = Counter("mlhks_critical_path_steps_total", "Times a step was on the critical path of an analysis", ["step"])
+GRAPH_STEP_SECONDS = Histogram("mlhks_graph_step_seconds", "Time from start to end of one analysis graph step", ["step"],
+                               buckets=BUCKETS)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# (name, seconds) or (name, seconds, description)
+Trace = List[Tuple]
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("mlhks_trace", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((stage, elapsed))
+
+
+def timed(stage: str, fn):
+    """fn wrapped in span(stage), e.g. for work handed to a thread pool."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span(stage):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def start_trace() -> Trace:
+    """Collects the spans of the current request (and the threads it hands work to with its context)."""
+    trace: Trace = []
+    _trace.set(trace)
+    return trace
+
+
+def server_timing(trace: Trace) -> str:
+    """A Server-Timing header value, e.g. `extraction;dur=812.4, summary;dur=2310.0`."""
+    entries = []
+    for stage, elapsed, *desc in trace:
+        entry = f"{stage};dur={elapsed * 1000:.1f}"
+        if desc:
+            entry += f';desc="{desc[0]}"'
+        entries.append(entry)
+    return ", ".join(entries)
+
+
+def record_stage_graph(timings: dict):
+    """
+    Records a StageGraph's timings(): each step's duration, and how often each step was on the
+    critical path. A traced request gets one `step_<name>;dur=...;desc="+<start> ms"` entry per
+    step and the critical path as `critical_path;dur=...;desc="a>b"`.
+    """
+    steps = timings["steps"]
+    for step, t in steps.items():
+        GRAPH_STEP_SECONDS.labels(step).observe(t["end"] - t["start"])
+    path = timings["critical_path"]
+    for step in path:
+        CRITICAL_PATH.labels(step).inc()
+    trace = _trace.get()
+    if trace is not None:
+        for step, t in sorted(steps.items(), key=lambda item: item[1]["start"]):
+            trace.append((f"step_{step}", t["end"] - t["start"], f"+{t['start'] * 1000:.1f} ms"))
+        if path:
+            trace.append(("critical_path", sum(steps[step]["end"] - steps[step]["start"] for step in path), ">".join(path)))
+
+
+def record_tokens(role: str, agent):
+    """Adds the token counts of an agent's last run; backends that do not report usage count as zero."""
+    monitor = getattr(agent, "monitor", None)
+    LLM_TOKENS.labels(role, "input").inc(getattr(monitor, "total_input_token_count", 0) or 0)
+    LLM_TOKENS.labels(role, "output").inc(getattr(monitor, "total_output_token_count", 0) or 0)
+
+
+class CacheCollector:
+    """Hit/miss counters of the document and response caches, read when /metrics is scraped."""
+
+    def describe(self):
+        # Registering must not build the caches
+        return []
+
+    def collect(self):
+        from document_cache import get_document_cache
+        from response_cache import get_response_cache
+
+        lookups = CounterMetricFamily("mlhks_cache_requests", "Cache lookups by result", labels=["cache", "result"])
+        hit_rate = GaugeMetricFamily("mlhks_cache_hit_rate", "Share of cache lookups that hit", labels=["cache"])
+        for name, stats in (("document", get_document_cache().stats()), ("response", get_response_cache().stats())):
+            lookups.add_metric([name, "hit"], stats["hits"])
+            lookups.add_metric([name, "miss"], stats["misses"])
+            hit_rate.add_metric([name], stats["hit_rate"])
+        yield lookups
+        yield hit_rate
+
+
+REGISTRY.register(CacheCollector())
+
+
+def render() -> bytes:
+    return generate_latest(REGISTRY)
@@ -1,9 +1,11 @@
-from fastapi import FastAPI, HTTPException,File,UploadFile,Form
-from pydantic import BaseModel, Field
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException,File,UploadFile,Form,Request
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional
-import requests
-import fitz
-from docx2python import docx2python
+import asyncio
+import functools
 import sqlite3
 import os
 import json
@@ -11,20 +13,31 @@ from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
-import tempfile
-import asyncio
-from fastapi.background import BackgroundTasks
-from smolagents import CodeAgent, LiteLLMModel, tool
-import itertools
-import pubchempy as pcp
+# smolagents, spaCy, PyMuPDF and docx2python are imported on first use or during warm-up (see warmup.py)
+from interaction_store import get_default_store
+from interaction_predictor import get_default_predictor
+from similarity_index import get_default_similarity_index
+import config
+from agent_registry import init_registry
+import pipeline
+from document_cache import get_document_cache
+from batch import get_batch_manager
+import jobs
+import metrics
+from response_cache import MISS, fingerprint, get_response_cache
+from document_text import extract_pdf_text, extract_word_text, shutdown_pdf_pool
+from uploads import RequestBudget, Upload, read_upload
+import context_retrieval
+from context_retrieval import select_relevant_context
+from warmup import readiness
+from stage_graph import StageGraph
+from patient_state import get_patient_state_store
+from contextlib import asynccontextmanager
 import traceback
-import spacy
-from spacy.language import Language
-from spacy.tokens import Span
-from spacy.util import filter_spans
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 
 
 
@@ -43,76 +56,71 @@ class Patient(BaseModel):
     question: str = Field( description="The question or issue the patient wants help with")
     user_document_data: Optional[str] = Field(default="", description="Extracted text from uploaded documents")
 
-@tool
 def connect_to__db() -> str:
     """
     Returns:
     str: A success message indicating the connection was established.
     """
     try:
-        conn = sqlite3.connect('/home/kronos/Desktop/mlhks/raman.db')
+        conn = sqlite3.connect(config.DATABASE_PATH)
         conn.close()
         return "Successfully connected to the database."
     except sqlite3.Error as e:
         return f"An error occurred: {e}"
 
-@tool
-def create_pairs(li: list) -> list:
-    """
-    Creates pairs of drugs from the input list and converts each drug to its SMILES representation.
-    
-    Args:
-        li: A list containing the names of the drugs.
-        
-    Returns:
-        list: A list of tuples, each containing a pair of drugs with their SMILES representations.
-              Only includes pairs where both drugs have valid SMILES.
-    """
+# Agents are built once at startup and checked out per request (see agent_registry)
+@functools.lru_cache(maxsize=None)
+def agent_specs() -> dict:
+    return {
+        "entity_extraction": dict(tools=[], name="entity_extraction_agent", description="Extracts medical drug entities from text and give it as a list."),
+        "summary": dict(tools=[], name="summary_agent", description="You are an agent synthesizing the drug interactions found for the patient.\
+                                You are to return the side effects of the drugs in the pairs in a user friendly manner and do not frighten the patient\
+                                just warn him of the potential side affects. Enrich the content with your knowledge"),
+    }
 
-    
-    def name_to_smiles(drug_name):
-        compounds = pcp.get_compounds(drug_name, 'name')
-        if compounds:
-            return compounds[0].canonical_smiles
-        return None
-    
-    # Convert drug names to (name, SMILES) pairs
-    drug_smiles = []
-    for drug in li:
-        smiles = name_to_smiles(drug)
-        if smiles:  # Only add drugs with valid SMILES
-            drug_smiles.append(smiles)
-    
-    # Create all possible pairs from valid drugs
-    pairs = list(itertools.combinations(drug_smiles, 2))
-    return pairs
-@tool
-def search_for_sideeffects(lis: list) -> str:
+
+def warmup_steps(model=None) -> dict:
     """
-    Searches for side effects of drug pairs in a database.    
+    What has to be loaded before the first analysis: the LLM model and agents, the
+    drug matcher, the interaction engine and the caches.
+
     Args:
-        lis: A list containing the names of the drugs.
-        
-    Returns:
-        str:  string containing the side effects for each drug pair.
+        model: Passed to init_registry, e.g. a stub model in the benchmarks.
     """
-    import sqlite3
-    p = []
-    for i in lis:
-        try:
-            conn = sqlite3.connect('/home/kronos/Desktop/mlhks/raman.db')
-            cursor = conn.cursor()
-            cursor.execute('''select Y from raman where Drug1 = ? and Drug2 = ?''', (i[0], i[1]))
-            rows = cursor.fetchall()
-            for row in rows:
-                p.append(str(row[0])) 
-            conn.close()
-        except sqlite3.Error as e:
-            return f"An error occurred: {e}"
-    return  ','.join(p)
+    from drug_cache import get_default_cache
+    from drug_extractor import get_extractor
+
+    return {
+        # Build the LLM model, its agents and the pooled HTTP clients before the first analysis
+        "agents": lambda: init_registry(agent_specs(), model=model),
+        "drug_matcher": get_extractor,
+        "interaction_db": lambda: get_default_store().lookup_pairs([]),
+        "interaction_predictor": get_default_predictor,
+        "similarity_index": get_default_similarity_index,
+        "smiles_cache": get_default_cache,
+        "document_cache": get_document_cache,
+        "response_cache": get_response_cache,
+        "patient_state": get_patient_state_store,
+    }
+
+
+def warm_up(model=None):
+    """Runs the warm-up steps on the calling thread."""
+    readiness.run(warmup_steps(model))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the process answers health checks straight away; /ready tells when it is done
+    readiness.start(warmup_steps())
+    job_workers = jobs.start_workers()
+    yield
+    jobs.stop_workers(job_workers)
+    shutdown_pdf_pool()
+
 
 # Initialize FastAPI
-app = FastAPI(debug=True)
+app = FastAPI(debug=True, lifespan=lifespan)
 origins = [
     "http://localhost:3000",  #  The origin of your React app (port 3000 is common for Create React App)
     "http://127.0.0.1:3000", #  Include this as well
@@ -125,22 +133,18 @@ app.add_middleware(
     allow_methods=["*"],  #  Allow all HTTP methods (POST, GET, etc.)
     allow_headers=["*"],  #  Allow all headers
 )
-def extract_text_from_pdf(file_path: str) -> str:
+def extract_text_from_pdf(source) -> str:
     try:
-        pdf_document = fitz.open(file_path)
-        all_text = ""
-        for page in pdf_document:
-            all_text += page.get_text() + "\n"
-        pdf_document.close()
-        return all_text.strip()
+        # source is the upload buffer or a path
+        return extract_pdf_text(source)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting text from PDF: {str(e)}")
 
 
-def extract_text_from_word(file_path: str) -> str:
+def extract_text_from_word(source) -> str:
     try:
-        doc_content = docx2python(file_path)
-        return doc_content.text.strip()
+        # source is the upload buffer or a path
+        return extract_word_text(source)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting text from Word document: {str(e)}")
 
@@ -162,9 +166,236 @@ def extract_text_from_word(file_path: str) -> str:
 
 
 
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    # Reject oversized bodies from the declared length, before the multipart form is parsed
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > config.MAX_REQUEST_SIZE:
+        return JSONResponse(status_code=413, content={"error": f"Request body exceeds {config.MAX_REQUEST_SIZE} bytes"})
+    return await call_next(request)
+
+
+# Upload types the analysis can read
+DOCUMENT_TYPES = (".pdf", ".docx")
+
+
+def check_document_type(filename: Optional[str]):
+    if not filename:
+        raise HTTPException(status_code=422, detail="Uploads need a filename with a .pdf or .docx extension")
+    if not filename.endswith(DOCUMENT_TYPES):
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {filename}")
+
+
+async def read_uploads(files: Optional[List[UploadFile]]) -> list:
+    """Streams every upload in and hashes it; the bytes stay in memory unless a file is very large."""
+    uploads = []
+    if files:
+        for file in files:
+            check_document_type(file.filename)
+        budget = RequestBudget()
+        try:
+            for file in files:
+                with metrics.span("upload_read"):
+                    uploads.append(await read_upload(file, budget))
+        except Exception:
+            for upload in uploads:
+                upload.close()
+            raise
+    return uploads
+
+
+async def extract_documents(uploads: list) -> str:
+    """
+    Text of all uploads, from the document cache where possible. A document that fails
+    to parse is left out.
+
+    Raises:
+        HTTPException: 400 for a file type other than PDF or DOCX.
+    """
+    extracted_texts = []
+    if uploads:
+        document_cache = get_document_cache()
+        for upload in uploads:
+            check_document_type(upload.filename)
+            cached_text = document_cache.get(upload.digest)
+            if cached_text is not None:
+                extracted_texts.append(cached_text)
+                continue
+
+            try:
+                if upload.filename.endswith(".pdf"):
+                    text = await pipeline.run_stage("documents", extract_text_from_pdf, upload.source)
+                else:
+                    text = await pipeline.run_stage("documents", extract_text_from_word, upload.source)
+                extracted_texts.append(text)
+                document_cache.put(upload.digest, text)
+            except Exception as e:
+                print(f"Error processing file {upload.filename}: {e}")
+    return "\n".join(extracted_texts)
+
+
+async def build_patient(combined_texts: str, **fields) -> Patient:
+    # Only the passages relevant to the question and medications go into the prompt; BM25 over a
+    # long document is CPU work, so it runs on the analysis pool like the other stages
+    relevant_texts = await pipeline.run_stage("documents", select_relevant_context, combined_texts,
+                                              " ".join([fields["question"], fields["medications"],
+                                                        fields["allergies"], fields["preexisting_conditions"]]))
+    patient_data = Patient(user_document_data=relevant_texts, **fields)
+    print("Patient data:", patient_data.dict())
+    return patient_data
+
+
+def response_key(uploads: list, **fields) -> str:
+    return fingerprint(fields["medications"], fields["allergies"], fields["preexisting_conditions"], fields["question"],
+                       [upload.digest for upload in uploads], prompt_version=pipeline.PROMPT_VERSION)
+
+
+def invalid_form(fields: dict) -> Optional[JSONResponse]:
+    """A 422 listing what is wrong when the form fields do not make a valid Patient, else None."""
+    try:
+        Patient(**fields)
+    except ValidationError as e:
+        return JSONResponse(status_code=422, content={"detail": json.loads(e.json())})
+    return None
+
+
+def not_ready() -> JSONResponse:
+    return JSONResponse(status_code=503, content={"error": "Still warming up, retry later", **readiness.status()},
+                        headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)})
+
+
+def too_busy() -> JSONResponse:
+    return JSONResponse(status_code=429, content={"error": "Too many analyses in progress, retry later", **pipeline.admission.status()},
+                        headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)})
+
+
+async def analyse(uploads: list, fields: dict, session_id: Optional[str] = None, on_step=None):
+    """
+    The analysis as a StageGraph. The medications listed in the form are resolved and
+    their pairs looked up while the documents parse and the drugs are extracted; after
+    that only the newly found drugs and their pairs are resolved and looked up.
+
+    With a session_id, what the session's last analysis resolved and found is reused the
+    same way, and when its drugs changed the summary covers only the changed interactions.
+
+    Args:
+        on_step: Passed to StageGraph.run, called with each step's name and result as it finishes.
+
+    Returns:
+        The summary, or None when no drugs were found.
+    """
+    graph = StageGraph()
+    state_store = get_patient_state_store() if session_id else None
+
+    async def documents():
+        return await extract_documents(uploads)
+
+    async def previous():
+        return await run_in_threadpool(state_store.get, session_id) if state_store else None
+
+    async def listed():
+        return await pipeline.run_stage("extraction", pipeline.listed_drugs, fields["medications"])
+
+    async def listed_smiles(listed, previous):
+        return await pipeline.run_stage("interactions", pipeline.resolve_drugs, listed,
+                                        known=previous["resolved"] if previous else None)
+
+    async def listed_interactions(listed_smiles, previous):
+        earlier = pipeline.interactions_within(previous["interactions"], listed_smiles) if previous else []
+        done = [[drug for drug in previous["resolved"] if drug in listed_smiles]] if previous else []
+        return pipeline.merge_interactions(earlier, await pipeline.run_stage(
+            "interactions", pipeline.lookup_interactions, listed_smiles, done=done))
+
+    async def drugs(documents):
+        patient_data = await build_patient(documents, **fields)
+        li = await pipeline.run_stage("extraction", pipeline.extract_drug_list, patient_data.dict(exclude={"question"}),
+                                      patient_data.question, fields["medications"], documents)
+        print("Extracted drugs:", li)
+        return li or []
+
+    async def smiles(drugs, listed_smiles, previous):
+        known = {**(previous["resolved"] if previous else {}), **listed_smiles}
+        return await pipeline.run_stage("interactions", pipeline.resolve_drugs, drugs, known=known)
+
+    async def interactions(smiles, listed_smiles, listed_interactions, previous):
+        # Pairs among the listed drugs, and among the session's earlier drugs, were looked up already
+        done = [[drug for drug in listed_smiles if drug in smiles]]
+        found = pipeline.interactions_within(listed_interactions, smiles)
+        if previous:
+            done.append([drug for drug in previous["resolved"] if drug in smiles])
+            found = pipeline.merge_interactions(found, pipeline.interactions_within(previous["interactions"], smiles))
+        if smiles:
+            found = pipeline.merge_interactions(found, await pipeline.run_stage(
+                "interactions", pipeline.lookup_interactions, smiles, done=done))
+        return found
+
+    async def saved(smiles, interactions):
+        if state_store and smiles:
+            await run_in_threadpool(state_store.put, session_id, smiles, interactions)
+
+    async def summary(drugs, interactions, previous):
+        if not drugs:
+            return None
+        if previous and set(previous["resolved"]) != set(drugs):
+            added, removed = pipeline.interaction_changes(previous["interactions"], interactions)
+            return await pipeline.run_stage("summary", pipeline.summarize_changes, added, removed, drugs,
+                                            started=[drug for drug in drugs if drug not in previous["resolved"]],
+                                            stopped=[drug for drug in previous["resolved"] if drug not in drugs])
+        return await pipeline.run_stage("summary", pipeline.summarize, interactions, drugs)
+
+    graph.add("documents", documents)
+    graph.add("previous", previous)
+    graph.add("listed", listed)
+    graph.add("listed_smiles", listed_smiles, after=["listed", "previous"])
+    graph.add("listed_interactions", listed_interactions, after=["listed_smiles", "previous"])
+    graph.add("drugs", drugs, after=["documents"])
+    graph.add("smiles", smiles, after=["drugs", "listed_smiles", "previous"])
+    graph.add("interactions", interactions, after=["smiles", "listed_smiles", "listed_interactions", "previous"])
+    graph.add("saved", saved, after=["smiles", "interactions"])
+    graph.add("summary", summary, after=["drugs", "interactions", "previous"])
+    try:
+        return (await graph.run(on_step))["summary"]
+    finally:
+        metrics.record_stage_graph(graph.timings())
+
+
+def run_analysis(documents: list, fields: dict, session_id: Optional[str] = None):
+    """
+    analyse() for callers without an event loop, e.g. the job workers, so a queued job
+    goes through exactly the same stages as /process-patient-data/.
+
+    Args:
+        documents: (filename, SHA-256, bytes) per upload, as the job table stores them.
+    """
+    uploads = [Upload(filename, digest, len(data), data=data) for filename, digest, data in documents]
+    try:
+        return asyncio.run(analyse(uploads, fields, session_id))
+    finally:
+        for upload in uploads:
+            upload.close()
+
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    # Latency per route; the per-stage spans of traced requests are returned as Server-Timing
+    trace = metrics.start_trace() if config.TRACE_REQUESTS or request.headers.get("x-trace") else None
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        metrics.REQUESTS_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        metrics.REQUEST_SECONDS.labels(request.method, route.path if route else "unmatched", str(status)).observe(time.perf_counter() - start)
+    if trace is not None:
+        response.headers["Server-Timing"] = metrics.server_timing(trace)
+    return response
+
+
 @app.post("/process-patient-data/")
 async def process_patient_data(
-    background_tasks: BackgroundTasks,
     age: int = Form(...),
     sex: str = Form(...),
     height: float = Form(...),
@@ -174,121 +405,259 @@ async def process_patient_data(
     medications: str = Form(...),
     family_history: str = Form(...),
     question: str = Form(...),
-    files: List[UploadFile] = File(None)
+    files: List[UploadFile] = File(None),
+    session_id: Optional[str] = Form(None)
 ):
+    if not readiness.ready:
+        return not_ready()
+    fields = dict(age=age, sex=sex, height=height, weight=weight, allergies=allergies,
+                  preexisting_conditions=preexisting_conditions, medications=medications,
+                  family_history=family_history, question=question)
+    # An invalid form is rejected before it can be answered from the response cache
+    invalid = invalid_form(fields)
+    if invalid is not None:
+        return invalid
+    if not pipeline.admission.try_acquire():
+        return too_busy()
     try:
-        extracted_texts = []
-        temp_files = []
-
-        if files:
-            for file in files:
-                # Create a temporary file with a unique name
-                with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp:
-                    temp_file_path = temp.name
-                    temp_files.append(temp_file_path)
-                    
-                    # Write content to the temporary file
-                    content = await file.read()
-                    temp.write(content)
-                
-                # Process the file after the file handle is closed
-                try:
-                    if file.filename.endswith(".pdf"):
-                        extracted_texts.append(extract_text_from_pdf(temp_file_path))
-                    elif file.filename.endswith(".docx"):
-                        extracted_texts.append(extract_text_from_word(temp_file_path))
-                    else:
-                        raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.filename}")
-                except Exception as e:
-                    print(f"Error processing file {file.filename}: {e}")
-        
-        # Add cleanup task to run in the background
-        background_tasks.add_task(cleanup_temp_files, temp_files)
-        
-        combined_texts = "\n".join(extracted_texts)
-        
-        # Create Patient object
-        patient_data = Patient(
-            age=age,
-            sex=sex,
-            height=height,
-            weight=weight,
-            allergies=allergies,
-            preexisting_conditions=preexisting_conditions,
-            medications=medications,
-            family_history=family_history,
-            question=question,
-            user_document_data=combined_texts,
-        )
-        
-        print("Patient data:", patient_data.dict())
-
-
-        context = patient_data.dict(exclude={"question"})
-        prompt = patient_data.question
-        
-        model = LiteLLMModel(model_id="gemini/gemini-2.0-flash", api_key=os.getenv("GEMINI_API_KEY"), temperature=0.1)
-        agent = CodeAgent(tools = [],model=model, name="Entity extraction Agent", description="Extracts medical drug entities from text and give it as a list.")
-        #The input to the agent from the user
-        result = agent.run(f'''You are a highly capable AI medical assistant supported by a statistical tool that provides 100% accurate detection of drug interactions, contraindications, and allergy conflicts.
-Consider the following patient context: {context}, which includes structured patient data, previous surgical records, prescribed medications, allergies, and diagnoses.
-The patient's question is: {prompt}
-Your task is to:
-Analyze the full context thoroughly, including past medical history and current medications.
-Identify and explain any possible causes for the patient's concern, based on side effects, allergies, medication interactions, or prior surgical outcomes.
-If there are any potential risks, medication conflicts, or red flags, describe them clearly and in detail.
-At the end of your response, provide a list of clear, patient-friendly questions the patient should ask their doctor during their next consultation.
-Be detailed, medically accurate, and empathetic. Ensure the output helps the patient better understand their condition and prepare for a meaningful discussion with their healthcare provider.''')
-        li = agent.memory.steps[-1].action_output
-       # li = extract_drugs(medications)
-        print("Extracted drugs:", li)
-
-        if li:
-
-            main_agent = CodeAgent(tools=[create_pairs,search_for_sideeffects], model=model,name="Final Agent", description="use the create_pairs tool first and then take the output of this tool and give it as an input to search  search_for_sideeffects")
-            main_agent.run('use the create_pairs tool first and then take the output of this tool and give it as an input to search  search_for_sideeffects', additional_args={"li": li})
-            summary_agent = CodeAgent(tools=[], model=model,name="Summary agent", description="You are an agent synthesizing the output of the final agent.\
-                                You are to return the side effects of the drugs in the pairs in a user friendly manner and do not frighten the patient\
-                                just warn him of the potential side affects. Enrich the content with your knowledge")
-                
-            lin = main_agent.memory.steps[-1].action_output
-            output=summary_agent.run(f" You should return an output as JSON, if output is NOne return the logs as output {main_agent.memory.steps[-1].action_output} is the possible side affects for the drugs that the patient has been taking and it has been  synthsized from FDA data within the drugs mentioned \
-                  in {li}, use the {li} to mention the drug names and give a \
-                  aprise the paitent by advocating the risks involved in a manner that \
-                  is easier to understand and not frightening and also give him questions he can take back to the doctor and this entire thing has to be my final answer and you will start this like a human speaking")
-            # The output to be displayed to the user
-            output = summary_agent.memory.steps[-1].action_output
-
-            
+        uploads = await read_uploads(files)
+        try:
+            # A repeat of an earlier request (same medications, question and documents) is answered from the cache.
+            # Not for sessions: their answer depends on what the session was told before
+            key = None if session_id else response_key(uploads, **fields)
+            cached_response = get_response_cache().get(key) if key else MISS
+            if cached_response is not MISS:
+                return cached_response
+            output = await analyse(uploads, fields, session_id)
+        finally:
+            for upload in uploads:
+                upload.close()
 
-            return output
+        if output is not None and key:
+            get_response_cache().put(key, output)
+        return output
 
+    except HTTPException:
+        raise
     except Exception as e:
         return {"error": str(e), "trace": traceback.format_exc()}
+    finally:
+        pipeline.admission.release()
     # try:
     #     llm_result = query_gemini_llm(prompt=prompt, context=context)
     #     return {"response": llm_result}
     # except HTTPException as e:
     #     return {"error": e.detail}
 
-async def cleanup_temp_files(temp_files: List[str]):
-    # Initial delay to ensure files are released
-    await asyncio.sleep(5)
-    
-    for temp_file in temp_files:
-        max_attempts = 5
-        for attempt in range(max_attempts):
-            try:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-                    print(f"Deleted temporary file: {temp_file}")
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Steps of analyse() whose results are streamed, under the same event names
+STREAMED_STEPS = ("drugs", "smiles", "interactions", "summary")
+
+
+async def analysis_events(uploads: list, fields: dict, session_id: Optional[str] = None):
+    """
+    Runs analyse() and yields a Server-Sent Event as each of its streamed steps finishes:
+    drugs, smiles, interactions, summary, then done (or error).
+    """
+    try:
+        key = None if session_id else response_key(uploads, **fields)
+        cached_response = get_response_cache().get(key) if key else MISS
+        if cached_response is not MISS:
+            yield sse_event("summary", cached_response)
+            yield sse_event("done", {"cached": True})
+            return
+
+        events = asyncio.Queue()
+
+        def on_step(name, result):
+            if name in STREAMED_STEPS and result is not None:
+                events.put_nowait((name, result))
+
+        task = asyncio.ensure_future(analyse(uploads, fields, session_id, on_step=on_step))
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
                     break
-            except Exception as e:
-                print(f"Attempt {attempt + 1} failed to delete {temp_file}: {e}")
-                if attempt < max_attempts - 1:
-                    await asyncio.sleep(2 ** attempt)  # Exponential backoff
-                else:
-                    print(f"Failed to delete temporary file after {max_attempts} attempts: {temp_file}")
-                    
+                yield sse_event(*event)
+            output = task.result()
+        finally:
+            # The client went away mid-stream
+            task.cancel()
+        if output is not None and key:
+            get_response_cache().put(key, output)
+        yield sse_event("done", {"cached": False})
+    except HTTPException as e:
+        yield sse_event("error", {"status": e.status_code, "error": e.detail})
+    except Exception as e:
+        yield sse_event("error", {"status": 500, "error": str(e)})
+    finally:
+        for upload in uploads:
+            upload.close()
+        pipeline.admission.release()
+
+
+@app.post("/process-patient-data/stream")
+async def process_patient_data_stream(
+    age: int = Form(...),
+    sex: str = Form(...),
+    height: float = Form(...),
+    weight: float = Form(...),
+    allergies: str = Form(...),
+    preexisting_conditions: str = Form(...),
+    medications: str = Form(...),
+    family_history: str = Form(...),
+    question: str = Form(...),
+    files: List[UploadFile] = File(None),
+    session_id: Optional[str] = Form(None)
+):
+    if not readiness.ready:
+        return not_ready()
+    fields = dict(age=age, sex=sex, height=height, weight=weight, allergies=allergies,
+                  preexisting_conditions=preexisting_conditions, medications=medications,
+                  family_history=family_history, question=question)
+    # Validated here rather than in analysis_events, which checks the response cache first
+    # and can no longer change the status code once the stream has started
+    invalid = invalid_form(fields)
+    if invalid is not None:
+        return invalid
+    if not pipeline.admission.try_acquire():
+        return too_busy()
+    try:
+        # Uploads are read before the response starts; the form is gone once the endpoint returns
+        uploads = await read_uploads(files)
+    except BaseException:
+        pipeline.admission.release()
+        raise
+    return StreamingResponse(analysis_events(uploads, fields, session_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/process-patient-data/batch")
+async def submit_batch(file: UploadFile = File(...)):
+    """Accepts a JSONL file of patient records and starts analysing it in the background."""
+    if not readiness.ready:
+        return not_ready()
+    upload = await read_upload(file, RequestBudget(), max_file_bytes=config.MAX_REQUEST_SIZE, spool_bytes=config.MAX_REQUEST_SIZE)
+    batch_id = get_batch_manager().submit(upload.data)
+    upload.close()
+    return JSONResponse(status_code=202, content=get_batch_manager().status(batch_id))
+
+
+@app.get("/process-patient-data/batch/{batch_id}")
+async def batch_status(batch_id: str):
+    status = get_batch_manager().status(batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown batch {batch_id}")
+    return status
+
+
+@app.get("/process-patient-data/batch/{batch_id}/results")
+async def batch_results(batch_id: str):
+    if get_batch_manager().status(batch_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown batch {batch_id}")
+    _, output_path = get_batch_manager().paths(batch_id)
+    if not os.path.exists(output_path):
+        raise HTTPException(status_code=404, detail=f"Batch {batch_id} has no results yet")
+    return FileResponse(output_path, media_type="application/x-ndjson", filename=f"{batch_id}.results.jsonl")
+
+
+@app.post("/process-patient-data/jobs")
+async def submit_job(
+    age: int = Form(...),
+    sex: str = Form(...),
+    height: float = Form(...),
+    weight: float = Form(...),
+    allergies: str = Form(...),
+    preexisting_conditions: str = Form(...),
+    medications: str = Form(...),
+    family_history: str = Form(...),
+    question: str = Form(...),
+    files: List[UploadFile] = File(None),
+    session_id: Optional[str] = Form(None)
+):
+    """Queues an analysis for the job workers and returns its id without waiting for it."""
+    fields = dict(age=age, sex=sex, height=height, weight=weight, allergies=allergies,
+                  preexisting_conditions=preexisting_conditions, medications=medications,
+                  family_history=family_history, question=question)
+    # Reject invalid forms now rather than in the worker
+    invalid = invalid_form(fields)
+    if invalid is not None:
+        return invalid
+    uploads = await read_uploads(files)
+    try:
+        # As for /process-patient-data/, session jobs bypass the response cache
+        key = None if session_id else response_key(uploads, **fields)
+        documents = []
+        for upload in uploads:
+            with upload.open() as f:
+                documents.append((upload.filename, upload.digest, f.read()))
+    finally:
+        for upload in uploads:
+            upload.close()
+    cached_response = get_response_cache().get(key) if key else MISS
+    job_id = await run_in_threadpool(jobs.get_job_store().submit, fields, documents, key,
+                                     None if cached_response is MISS else cached_response, session_id)
+    return JSONResponse(status_code=202, content=jobs.get_job_store().status(job_id),
+                        headers={"Location": f"/process-patient-data/jobs/{job_id}"})
+
+
+@app.get("/process-patient-data/jobs/{job_id}")
+async def job_status(job_id: str):
+    status = jobs.get_job_store().status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return status
+
+
+@app.get("/process-patient-data/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    status = jobs.get_job_store().status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    if status["state"] == jobs.FAILED:
+        return JSONResponse(status_code=500, content=status)
+    if status["state"] != jobs.DONE:
+        return JSONResponse(status_code=409, content=status, headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)})
+    return jobs.get_job_store().result(job_id)
+
+
+@app.get("/ready")
+async def ready():
+    """200 once the agents and the interaction DB are loaded, 503 before; every warm-up step is reported."""
+    return JSONResponse(status_code=200 if readiness.ready else 503, content=readiness.status())
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/document-cache/stats")
+async def document_cache_stats():
+    return get_document_cache().stats()
+
+
+@app.get("/response-cache/stats")
+async def response_cache_stats():
+    return get_response_cache().stats()
+
+
+@app.get("/interaction-predictor/stats")
+async def interaction_predictor_stats():
+    predictor = get_default_predictor()
+    if predictor is None:
+        return {"enabled": False}
+    return {"enabled": True, **predictor.stats()}
+
+
+@app.get("/context-retrieval/stats")
+async def context_retrieval_stats():
+    return context_retrieval.stats.snapshot()
+
 
-                                                                                    
+readiness.import_seconds = time.perf_counter() - _IMPORT_STARTED
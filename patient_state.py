@@ -0,0 +1,78 @@
+"""
+Analysis state of returning patients.
+
+A client that sends a session_id with /process-patient-data/ gets the drugs
+resolved for that session and the interactions found among them stored here.
+When the session comes back with a changed medication list, only the new
+drugs are resolved and only pairs involving them are looked up. The summary
+is told what changed instead of being given every interaction again.
+
+Session ids are stored as SHA-256 digests, and a session is forgotten after
+config.PATIENT_STATE_TTL seconds without a request.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import config
+
+
+def session_key(session_id: str) -> str:
+    return hashlib.sha256(session_id.encode()).hexdigest()
+
+
+class PatientStateStore:
+    def __init__(self, path: str = config.PATIENT_STATE_PATH, ttl: float = config.PATIENT_STATE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''create table if not exists patient_state (
+                                  session text primary key,
+                                  resolved text not null,
+                                  interactions text not null,
+                                  expires_at real not null
+                              ) without rowid''')
+        self._conn.commit()
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """
+        Returns:
+            dict: {"resolved": {drug: SMILES or None}, "interactions": [records]} from the
+                session's last analysis, or None for a new or expired session.
+        """
+        with self._lock:
+            row = self._conn.execute('''select resolved, interactions from patient_state where session = ? and expires_at > ?''',
+                                     (session_key(session_id), time.time())).fetchone()
+        if row is None:
+            return None
+        return {"resolved": json.loads(row[0]), "interactions": json.loads(row[1])}
+
+    def put(self, session_id: str, resolved: Dict[str, Optional[str]], interactions: List[dict]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute('''insert or replace into patient_state (session, resolved, interactions, expires_at) values (?, ?, ?, ?)''',
+                               (session_key(session_id), json.dumps(resolved), json.dumps(interactions), now + self.ttl))
+            self._conn.execute('''delete from patient_state where expires_at <= ?''', (now,))
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_patient_state_store() -> PatientStateStore:
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = PatientStateStore()
+    return _default_store
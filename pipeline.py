@@ -0,0 +1,230 @@
+"""
+Stages of the patient analysis and how they are run off the event loop.
+
+Every stage is a plain synchronous function. The endpoint awaits them through
+run_stage(), which executes them on a bounded thread pool with a per-stage
+timeout, so a slow LLM call or PubChem lookup never blocks other clients.
+Drug extraction tries the local matcher before spending an LLM call. The
+interaction stage is plain Python, with no agent: resolve_drugs() then one
+batched lookup_interactions() for all pairs, whose structured records go
+straight into the summary prompt. The streaming endpoint runs the two steps
+separately to report each as it completes; /process-patient-data/ runs them
+in a StageGraph, starting on the listed medications while documents parse.
+AdmissionControl caps the number of analyses in flight.
+"""
+import asyncio
+import contextvars
+import functools
+import itertools
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+import config
+import metrics
+from agent_registry import get_registry
+from drug_extractor import extract_drugs
+from interaction_predictor import get_default_predictor
+from interaction_store import get_default_store
+from similarity_index import get_default_similarity_index
+from pubchem_resolver import resolve_many
+
+# Part of the response cache key; bump whenever an agent prompt below changes
+PROMPT_VERSION = "3"
+
+ANALYSIS_EXECUTOR = ThreadPoolExecutor(max_workers=config.ANALYSIS_WORKERS, thread_name_prefix="analysis")
+
+
+class AdmissionControl:
+    """Counts analyses in flight; callers past max_in_flight should be turned away with a 429."""
+
+    def __init__(self, max_in_flight: int = config.MAX_IN_FLIGHT_ANALYSES):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+
+    def try_acquire(self) -> bool:
+        # Only touched from the event loop thread, so no lock is needed
+        if self.in_flight >= self.max_in_flight:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+
+    def status(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": max(0, self.in_flight - config.ANALYSIS_WORKERS),
+        }
+
+
+admission = AdmissionControl()
+metrics.ANALYSES_IN_FLIGHT.set_function(lambda: admission.in_flight)
+
+
+async def run_stage(stage: str, fn, *args, **kwargs):
+    """
+    Runs a blocking stage on the analysis pool.
+
+    Raises:
+        HTTPException: 504 if the stage exceeds its timeout from config.STAGE_TIMEOUTS.
+            The worker thread is not interrupted; it finishes in the background.
+    """
+    loop = asyncio.get_running_loop()
+    # The request's context goes along, so spans inside the stage land in its trace
+    context = contextvars.copy_context()
+    future = loop.run_in_executor(ANALYSIS_EXECUTOR, context.run, functools.partial(fn, *args, **kwargs))
+    with metrics.span(stage):
+        try:
+            return await asyncio.wait_for(future, timeout=config.STAGE_TIMEOUTS[stage])
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail=f"The {stage} stage timed out after {config.STAGE_TIMEOUTS[stage]} s")
+
+
+def extract_drug_list(context: dict, prompt: str, medications: str, document_text: str):
+    """Matches drug names locally and only falls back to the extraction agent on low confidence."""
+    drugs, confidence = extract_drugs(medications, document_text)
+    if drugs and confidence >= config.DRUG_MATCH_MIN_CONFIDENCE:
+        return drugs
+    print(f"Drug matcher confidence {confidence:.2f}, falling back to the extraction agent")
+    return extract_entities(context, prompt)
+
+
+def run_agent(role: str, task: str, **kwargs):
+    """Runs a pooled agent of the given role on a fresh memory and returns its final answer."""
+    with get_registry().checkout(role) as agent, metrics.span(f"agent_{role}"):
+        agent.run(task, reset=True, **kwargs)
+        metrics.record_tokens(role, agent)
+        return agent.memory.steps[-1].action_output
+
+
+def extract_entities(context: dict, prompt: str):
+    #The input to the agent from the user
+    return run_agent("entity_extraction", f'''You are a highly capable AI medical assistant supported by a statistical tool that provides 100% accurate detection of drug interactions, contraindications, and allergy conflicts.
+Consider the following patient context: {context}, which includes structured patient data, previous surgical records, prescribed medications, allergies, and diagnoses.
+The patient's question is: {prompt}
+Your task is to:
+Analyze the full context thoroughly, including past medical history and current medications.
+Identify and explain any possible causes for the patient's concern, based on side effects, allergies, medication interactions, or prior surgical outcomes.
+If there are any potential risks, medication conflicts, or red flags, describe them clearly and in detail.
+At the end of your response, provide a list of clear, patient-friendly questions the patient should ask their doctor during their next consultation.
+Be detailed, medically accurate, and empathetic. Ensure the output helps the patient better understand their condition and prepare for a meaningful discussion with their healthcare provider.''')
+
+
+def listed_drugs(medications: str) -> List[str]:
+    """The drugs the local matcher finds in the medications field alone, known before any document is parsed."""
+    drugs, _ = extract_drugs(medications)
+    return drugs
+
+
+def resolve_drugs(li, known: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Optional[str]]:
+    """
+    Maps each extracted drug name to its SMILES (None when unknown): cache first, then concurrent PubChem lookups.
+
+    Args:
+        known: Names resolved earlier (e.g. the listed medications); only the others are looked up.
+    """
+    known = known or {}
+    missing = [drug for drug in li if drug not in known]
+    resolved = resolve_many(missing) if missing else {}
+    return {drug: known[drug] if drug in known else resolved.get(drug) for drug in li}
+
+
+def lookup_interactions(resolved: Dict[str, Optional[str]], store=None, predictor=None, done=(),
+                        analogues=None) -> List[dict]:
+    """
+    Looks up every pair of resolved drugs in one batched query.
+
+    Args:
+        store: Anything with lookup_pairs/side_effect_names; the default interaction engine if omitted.
+        predictor: Scores the pairs the store knows nothing about; the default predictor
+            (if configured) when omitted, False to look up known interactions only.
+        done: Groups of drug names whose pairs among themselves were already looked up; those pairs are skipped.
+        analogues: Similarity index for pairs with a drug missing from the database; the default
+            index (if a fingerprint store exists) when omitted, False to skip.
+
+    Returns:
+        list: One {"drugs", "side_effect_ids", "side_effects"} record per pair with
+            interactions, side_effects being the labels of the ids. Records taken from
+            structural analogues have "inferred": True, the database "analogues" used and
+            their Tanimoto "similarity"; predicted records have "predicted": True and the
+            "probabilities" of their side effects.
+    """
+    names = {}
+    for drug, smiles in resolved.items():
+        if smiles:
+            names.setdefault(smiles, drug)
+    groups = {}
+    for i, group in enumerate(done):
+        for drug in group:
+            if resolved.get(drug):
+                groups.setdefault(resolved[drug], set()).add(i)
+    store = store or get_default_store()
+    interactions = store.lookup_pairs((a, b) for a, b in itertools.combinations(names, 2)
+                                      if not groups.get(a, set()) & groups.get(b, set()))
+    labels = store.side_effect_names(y for side_effects in interactions.values() for y in side_effects)
+    found = [{"drugs": [names[a], names[b]], "side_effect_ids": side_effects,
+              "side_effects": [labels.get(y, str(y)) for y in side_effects]}
+             for (a, b), side_effects in interactions.items() if side_effects]
+    unknown = [pair for pair, side_effects in interactions.items() if not side_effects]
+    analogues = get_default_similarity_index() if analogues is None else analogues
+    if analogues and unknown:
+        inferred = analogues.infer(unknown, store)
+        labels = store.side_effect_names(y for record in inferred.values() for y in record["side_effect_ids"])
+        for (a, b), record in inferred.items():
+            found.append({"drugs": [names[a], names[b]], "side_effect_ids": record["side_effect_ids"],
+                          "side_effects": [labels.get(y, str(y)) for y in record["side_effect_ids"]],
+                          "inferred": True, "analogues": record["analogues"], "similarity": record["similarity"]})
+        unknown = [pair for pair in unknown if pair not in inferred]
+    predictor = get_default_predictor() if predictor is None else predictor
+    if predictor and unknown:
+        predicted = predictor.predict_pairs(unknown)
+        for (a, b), side_effects in predicted.items():
+            if side_effects:
+                found.append({"drugs": [names[a], names[b]], "side_effect_ids": [y for y, _ in side_effects],
+                              "side_effects": [predictor.side_effect_names.get(y, str(y)) for y, _ in side_effects],
+                              "predicted": True, "probabilities": [round(p, 4) for _, p in side_effects]})
+    return found
+
+
+def interactions_within(records: List[dict], drugs) -> List[dict]:
+    """The records whose two drugs are both among drugs."""
+    return [record for record in records if all(drug in drugs for drug in record["drugs"])]
+
+
+def merge_interactions(*record_lists: List[dict]) -> List[dict]:
+    """Concatenates interaction records, keeping the first record of each pair."""
+    merged = {}
+    for records in record_lists:
+        for record in records:
+            merged.setdefault(frozenset(record["drugs"]), record)
+    return list(merged.values())
+
+
+def interaction_changes(previous: List[dict], current: List[dict]) -> Tuple[List[dict], List[dict]]:
+    """The records of pairs that are new in current, and of those in previous that no longer apply."""
+    before = {frozenset(record["drugs"]) for record in previous}
+    after = {frozenset(record["drugs"]) for record in current}
+    return ([record for record in current if frozenset(record["drugs"]) not in before],
+            [record for record in previous if frozenset(record["drugs"]) not in after])
+
+
+def summarize(interactions: List[dict], li):
+    # The output to be displayed to the user
+    return run_agent("summary", f" You should return an output as JSON. {json.dumps(interactions)} are the drug pairs with possible side affects for the drugs that the patient has been taking, synthsized from FDA data within the drugs mentioned \
+                  in {li}; pairs marked inferred were not in the FDA data and come from structurally similar drugs, with their similarity, and pairs marked predicted come from a model, with the probability of each side effect. If the list is empty no interactions were found. Use the {li} to mention the drug names and give a \
+                  aprise the paitent by advocating the risks involved in a manner that \
+                  is easier to understand and not frightening and also give him questions he can take back to the doctor and this entire thing has to be my final answer and you will start this like a human speaking")
+
+
+def summarize_changes(added: List[dict], removed: List[dict], li, started: List[str], stopped: List[str]):
+    # A returning patient whose medications changed: only what changed goes into the prompt
+    return run_agent("summary", f" You should return an output as JSON. The patient was advised before and their medications changed: they started {started} and stopped {stopped}, and now take {li}. \
+                  {json.dumps(added)} are the drug pairs with possible side affects that are new with this change and {json.dumps(removed)} are those that no longer apply, synthsized from FDA data; \
+                  pairs marked inferred were not in the FDA data and come from structurally similar drugs, with their similarity, and pairs marked predicted come from a model, with the probability of each side effect. Explain only what changed, \
+                  aprise the paitent by advocating the risks involved in a manner that \
+                  is easier to understand and not frightening and also give him questions he can take back to the doctor and this entire thing has to be my final answer and you will start this like a human speaking")
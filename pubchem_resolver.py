@@ -0,0 +1,142 @@
+"""
+Concurrent, batched drug name -> SMILES resolution against PubChem PUG REST.
+
+resolve_many() deduplicates the names of a request, answers what it can from
+the SMILES cache and fans the remaining lookups out on a bounded thread pool,
+so a list of unresolved drugs costs roughly one PubChem round trip instead of N.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+from urllib.parse import quote
+
+import config
+import metrics
+from drug_cache import MISS, SmilesCache, get_default_cache, normalize_name
+
+# Status codes worth retrying; anything else is treated as a definitive answer
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class PubChemUnavailable(Exception):
+    """Raised when PubChem could not be reached after all retries."""
+
+
+class PubChemResolver:
+    def __init__(self, base_url: str = config.PUBCHEM_BASE_URL, max_workers: int = config.PUBCHEM_MAX_WORKERS,
+                 timeout: float = config.PUBCHEM_TIMEOUT, retries: int = config.PUBCHEM_RETRIES,
+                 backoff: float = config.PUBCHEM_BACKOFF, cache: Optional[SmilesCache] = None):
+        self.base_url = base_url.rstrip("/")
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache
+        # Imported here so that importing the pipeline does not pull in requests at startup
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pubchem")
+
+    def fetch_smiles(self, drug_name: str) -> Optional[str]:
+        """
+        Looks one drug name up on PubChem.
+
+        Returns:
+            The SMILES, or None if PubChem does not know the name.
+
+        Raises:
+            PubChemUnavailable: if every attempt timed out or failed with a retryable error.
+        """
+        import requests
+
+        url = f"{self.base_url}/compound/name/{quote(drug_name, safe='')}/property/CanonicalSMILES/JSON"
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+            try:
+                response = self._session.get(url, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                last_error = e
+                continue
+            if response.status_code == 404:
+                return None
+            if response.status_code in RETRY_STATUS:
+                last_error = f"HTTP {response.status_code}"
+                continue
+            response.raise_for_status()
+            properties = response.json().get("PropertyTable", {}).get("Properties", [])
+            if not properties:
+                return None
+            # PubChem now reports the canonical form as ConnectivitySMILES for some records
+            return properties[0].get("CanonicalSMILES") or properties[0].get("ConnectivitySMILES")
+        raise PubChemUnavailable(f"PubChem lookup failed for {drug_name}: {last_error}")
+
+    def resolve_many(self, names: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Resolves many drug names in one call.
+
+        Args:
+            names: Drug names as typed by the user; duplicates are looked up once.
+
+        Returns:
+            dict: Maps every input name to its SMILES, or None if it is unknown or PubChem is unreachable.
+        """
+        cache = self.cache or get_default_cache()
+        names = list(names)
+        by_key = {}
+        for name in names:
+            by_key.setdefault(normalize_name(name), " ".join(str(name).split()))
+
+        resolved = {}
+        pending = {}
+        for key, name in by_key.items():
+            if not key:
+                resolved[key] = None
+                continue
+            smiles = cache.get(key)
+            metrics.CACHE_LOOKUPS.labels("smiles", "miss" if smiles is MISS else "hit").inc()
+            if smiles is MISS:
+                # Each lookup runs in a copy of the caller's context so its span joins the request's trace
+                context = contextvars.copy_context()
+                pending[key] = self._executor.submit(context.run, metrics.timed("pubchem_lookup", self.fetch_smiles), name)
+            else:
+                resolved[key] = smiles
+
+        fresh = []
+        for key, future in pending.items():
+            try:
+                resolved[key] = future.result()
+                fresh.append((key, resolved[key]))
+            except Exception as e:
+                # Not cached, so the name is retried on the next request
+                print(f"Error resolving {by_key[key]} on PubChem: {e}")
+                resolved[key] = None
+        if fresh:
+            cache.put_many(fresh)
+
+        return {name: resolved[normalize_name(name)] for name in names}
+
+
+_default_resolver = None
+_default_resolver_lock = threading.Lock()
+
+
+def get_default_resolver() -> PubChemResolver:
+    global _default_resolver
+    if _default_resolver is None:
+        with _default_resolver_lock:
+            if _default_resolver is None:
+                _default_resolver = PubChemResolver()
+    return _default_resolver
+
+
+def resolve_many(names: Iterable[str]) -> Dict[str, Optional[str]]:
+    return get_default_resolver().resolve_many(names)
@@ -0,0 +1,184 @@
+"""
+Cache of finished patient analyses, keyed by a fingerprint of the request.
+
+Near-identical requests (same medications, allergies, conditions and question,
+same documents) produce the same answer, so the final output is cached under
+a SHA-256 of the normalized inputs plus the model id and prompt version. List
+fields are compared as sorted sets of normalized entries, so "Aspirin,
+atorvastatin" and "Atorvastatin; aspirin" share an entry.
+
+Two backends are available, selected by config.RESPONSE_CACHE_BACKEND:
+"memory" is an in-process LRU with a TTL, "redis" talks to a Redis-compatible
+server at config.RESPONSE_CACHE_URL so all uvicorn workers share one cache
+(eviction there is left to the server's maxmemory-policy). "off" disables it.
+"""
+import hashlib
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+import config
+from drug_cache import normalize_name
+from drug_extractor import MEDICATION_SEPARATORS
+
+# Returned by ResponseCache.get when nothing is cached
+MISS = object()
+KEY_PREFIX = "mlhks:response:"
+
+
+def normalize_list(text: str) -> list:
+    """Sorted, de-duplicated entries of a free-text list field."""
+    return sorted({normalize_name(part) for part in MEDICATION_SEPARATORS.split(text or "") if part.strip()})
+
+
+def fingerprint(medications: str, allergies: str, conditions: str, question: str, document_digests: Iterable[str] = (),
+                model_id: str = config.LLM_MODEL_ID, prompt_version: str = "") -> str:
+    """
+    Cache key for one analysis request.
+
+    Args:
+        document_digests: SHA-256 of every upload, in upload order.
+        prompt_version: Bumped whenever the agent prompts change, so stale answers are not served.
+    """
+    payload = json.dumps({
+        "medications": normalize_list(medications),
+        "allergies": normalize_list(allergies),
+        "conditions": normalize_list(conditions),
+        "question": normalize_name(question),
+        "documents": list(document_digests),
+        "model": model_id,
+        "prompt_version": prompt_version,
+    }, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(ABC):
+    """Hit/miss counting shared by the backends."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _count(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @abstractmethod
+    def get(self, key: str):
+        """Returns the cached response, or MISS."""
+
+    @abstractmethod
+    def put(self, key: str, response):
+        """Stores a response under key."""
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": config.RESPONSE_CACHE_BACKEND,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class NullResponseCache(ResponseCache):
+    def get(self, key: str):
+        return MISS
+
+    def put(self, key: str, response):
+        pass
+
+
+class MemoryResponseCache(ResponseCache):
+    """In-process LRU bounded by entry count; entries expire ttl seconds after they are stored."""
+
+    def __init__(self, max_entries: int = config.RESPONSE_CACHE_MAX_ENTRIES, ttl: float = config.RESPONSE_CACHE_TTL):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, response)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        self._count(entry is not None)
+        return MISS if entry is None else entry[1]
+
+    def put(self, key: str, response):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._lock:
+            stats.update(entries=len(self._entries), max_entries=self.max_entries, evictions=self.evictions, ttl=self.ttl)
+        return stats
+
+
+class RedisResponseCache(ResponseCache):
+    """Shared cache on a Redis-compatible server; responses are stored as JSON with a TTL."""
+
+    def __init__(self, url: str = config.RESPONSE_CACHE_URL, ttl: float = config.RESPONSE_CACHE_TTL):
+        import redis
+
+        super().__init__()
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url, socket_timeout=1.0)
+
+    def get(self, key: str):
+        try:
+            raw = self._client.get(KEY_PREFIX + key)
+        except Exception as e:
+            print(f"Response cache unavailable: {e}")
+            raw = None
+        self._count(raw is not None)
+        return MISS if raw is None else json.loads(raw)
+
+    def put(self, key: str, response):
+        try:
+            self._client.set(KEY_PREFIX + key, json.dumps(response), ex=max(1, int(self.ttl)))
+        except Exception as e:
+            print(f"Response cache unavailable: {e}")
+
+
+def build_response_cache(backend: str = config.RESPONSE_CACHE_BACKEND) -> ResponseCache:
+    if backend == "off":
+        return NullResponseCache()
+    if backend == "memory":
+        return MemoryResponseCache()
+    if backend == "redis":
+        return RedisResponseCache()
+    raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND {backend!r}; expected memory, redis or off")
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = build_response_cache()
+    return _default_cache
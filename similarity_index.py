@@ -0,0 +1,163 @@
+"""
+Structural nearest neighbours among the interaction database's drugs.
+
+A drug whose SMILES never appears in the database gets no interaction data
+at all. The index finds the database drugs most similar to it: Tanimoto
+similarity over the packed Morgan fingerprints of the fingerprint store,
+|A & B| / (|A| + |B| - |A & B|), computed for all candidates at once with a
+vectorised popcount.
+
+Rows are sorted by bit count. Two fingerprints with c and d bits set can be
+at most min(c, d) / max(c, d) similar, so a query with c bits and a minimum
+similarity t only scans the contiguous rows with t * c <= d <= c / t.
+
+infer() looks up pairs of close analogues when a drug is missing from the
+database; lookup_interactions reports those records as "inferred" with the
+analogues and their similarities.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import config
+import metrics
+from fingerprint_store import FingerprintStore, get_default_fingerprint_store, morgan_fingerprint
+
+# Slack on the bit-count bounds: 0.55 * 100 is 55.00000000000001 in floating point, and ceil() of
+# that would skip the rows exactly on the threshold. search() filters on the exact similarity anyway
+BOUND_EPSILON = 1e-9
+
+# Set bits per byte, for NumPy builds without np.bitwise_count (added in 2.0)
+POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(bits: np.ndarray) -> np.ndarray:
+    """Set bits per row of a packed uint8 matrix."""
+    if hasattr(np, "bitwise_count") and bits.shape[-1] % 8 == 0:
+        words = np.ascontiguousarray(bits).view(np.uint64)
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int32)
+    return POPCOUNT_TABLE[bits].sum(axis=-1, dtype=np.int32)
+
+
+class SimilarityIndex:
+    def __init__(self, smiles: List[str], bits: np.ndarray, radius: int, n_bits: int):
+        counts = popcount(bits)
+        order = np.argsort(counts, kind="stable")
+        self.smiles = [smiles[i] for i in order]
+        self.bits = np.ascontiguousarray(bits[order])
+        self.counts = counts[order]
+        self.drug_ids = {s: i for i, s in enumerate(self.smiles)}
+        self.radius = radius
+        self.n_bits = n_bits
+
+    @classmethod
+    def from_store(cls, store: FingerprintStore) -> "SimilarityIndex":
+        """Every parsable drug of the fingerprint store."""
+        known = [(smiles, drug_id) for smiles, drug_id in store.drug_ids.items() if store.valid[drug_id]]
+        ids = np.array([drug_id for _, drug_id in known], dtype=np.int64)
+        return cls([smiles for smiles, _ in known], store.bits[ids], store.radius, store.n_bits)
+
+    def __len__(self) -> int:
+        return len(self.smiles)
+
+    def fingerprint(self, smiles: str) -> Optional[np.ndarray]:
+        """The packed fingerprint of any SMILES, from the index when it is a database drug."""
+        i = self.drug_ids.get(smiles)
+        if i is not None:
+            return self.bits[i]
+        fp = morgan_fingerprint(smiles, self.radius, self.n_bits)
+        return None if fp is None else np.packbits(fp)
+
+    def search(self, query: np.ndarray, k: int = config.SIMILARITY_NEIGHBOURS,
+               min_similarity: float = config.SIMILARITY_MIN_TANIMOTO) -> List[Tuple[str, float]]:
+        """
+        The k database drugs most similar to a packed fingerprint.
+
+        Args:
+            min_similarity: Drugs below this Tanimoto similarity are left out; above 0 it
+                also bounds the bit counts scanned.
+
+        Returns:
+            list: (SMILES, similarity) tuples, most similar first.
+        """
+        count = int(popcount(query[None, :])[0])
+        if count == 0 or not len(self.smiles):
+            return []
+        if min_similarity > 0:
+            lo = np.searchsorted(self.counts, int(np.ceil(min_similarity * count - BOUND_EPSILON)), side="left")
+            hi = np.searchsorted(self.counts, int(np.floor(count / min_similarity + BOUND_EPSILON)), side="right")
+        else:
+            lo, hi = 0, len(self.smiles)
+        if lo >= hi:
+            return []
+        common = popcount(self.bits[lo:hi] & query)
+        similarity = common / (self.counts[lo:hi] + count - common)
+        if k < len(similarity):
+            top = np.argpartition(-similarity, k - 1)[:k]
+        else:
+            top = np.arange(len(similarity))
+        top = top[np.argsort(-similarity[top], kind="stable")]
+        return [(self.smiles[lo + i], float(similarity[i])) for i in top.tolist() if similarity[i] >= min_similarity]
+
+    def neighbours(self, smiles: str, k: int = config.SIMILARITY_NEIGHBOURS,
+                   min_similarity: float = config.SIMILARITY_MIN_TANIMOTO) -> List[Tuple[str, float]]:
+        """search() for a SMILES; an empty list when it does not parse."""
+        query = self.fingerprint(smiles)
+        return [] if query is None else self.search(query, k, min_similarity)
+
+    def infer(self, pairs: Iterable[Tuple[str, str]], store, k: int = config.SIMILARITY_NEIGHBOURS,
+              min_similarity: float = config.SIMILARITY_MIN_TANIMOTO) -> Dict[Tuple[str, str], dict]:
+        """
+        Interactions of drug pairs with a drug missing from the database, taken from their closest analogues.
+
+        Every drug missing from the index is replaced by its k nearest database drugs, and
+        all analogue pairs are looked up in one batch. Per pair, the analogue pair with
+        interactions whose lower similarity is highest wins.
+
+        Args:
+            store: Anything with lookup_pairs, e.g. the default interaction engine.
+
+        Returns:
+            dict: Maps each pair something was found for to {"side_effect_ids", "analogues",
+                "similarity"}, analogues being the database SMILES used for each drug.
+        """
+        pairs = [pair for pair in dict.fromkeys(tuple(p) for p in pairs)
+                 if pair[0] not in self.drug_ids or pair[1] not in self.drug_ids]
+        if not pairs:
+            return {}
+        with metrics.span("similarity_search"):
+            neighbours = {}
+            for smiles in {s for pair in pairs for s in pair}:
+                neighbours[smiles] = [(smiles, 1.0)] if smiles in self.drug_ids else self.neighbours(smiles, k, min_similarity)
+            candidates = {}
+            for a, b in pairs:
+                options = [((na, nb), sa, sb) for na, sa in neighbours[a] for nb, sb in neighbours[b] if na != nb]
+                candidates[(a, b)] = sorted(options, key=lambda option: -min(option[1], option[2]))
+        found = store.lookup_pairs(option[0] for options in candidates.values() for option in options)
+        inferred = {}
+        for pair, options in candidates.items():
+            for analogues, sa, sb in options:
+                if found.get(analogues):
+                    inferred[pair] = {"side_effect_ids": found[analogues], "analogues": list(analogues),
+                                      "similarity": [round(sa, 4), round(sb, 4)]}
+                    break
+        return inferred
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+_default_index_loaded = False
+
+
+def get_default_similarity_index() -> Optional[SimilarityIndex]:
+    """An index over the default fingerprint store, or None when no store has been built."""
+    global _default_index, _default_index_loaded
+    if not _default_index_loaded:
+        with _default_index_lock:
+            if not _default_index_loaded:
+                store = get_default_fingerprint_store()
+                if store is not None:
+                    _default_index = SimilarityIndex.from_store(store)
+                _default_index_loaded = True
+    return _default_index
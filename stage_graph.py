@@ -0,0 +1,91 @@
+"""
+Dependency-graph execution of the analysis stages.
+
+Steps are coroutines declared with the steps whose results they need. Each
+starts as soon as those are done, so independent work overlaps: resolving the
+drugs listed in the medications field runs while documents are still being
+parsed and the extraction agent is still running. End-to-end latency then
+approaches the longest chain of dependent steps, not the sum of all steps.
+
+After a run, timings() has each step's start and end relative to the start
+of the run, and critical_path() walks back from the step that finished last
+through the dependency that held up each step. metrics.record_stage_graph()
+exports both and adds them to the request's Server-Timing trace.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class StageGraph:
+    def __init__(self):
+        self._steps: Dict[str, Tuple[Callable[..., Awaitable], Tuple[str, ...]]] = {}
+        self.started: Dict[str, float] = {}
+        self.finished: Dict[str, float] = {}
+
+    def add(self, name: str, fn: Callable[..., Awaitable], after: Iterable[str] = ()):
+        """
+        Declares a step. Dependencies must be added first, which keeps the graph acyclic.
+
+        Args:
+            fn: Coroutine function called with the results of the steps in after, as keyword arguments.
+        """
+        after = tuple(after)
+        unknown = [dependency for dependency in after if dependency not in self._steps]
+        if name in self._steps or unknown:
+            raise ValueError(f"Cannot add step {name}: duplicate name or unknown dependencies {unknown}")
+        self._steps[name] = (fn, after)
+
+    async def run(self, on_step: Optional[Callable[[str, object], None]] = None) -> Dict[str, object]:
+        """
+        Runs every step and returns their results by name; the first failure cancels the rest and is raised.
+
+        Args:
+            on_step: Called with the name and result of each step as soon as it finishes, e.g. to stream it.
+        """
+        origin = time.perf_counter()
+        tasks: Dict[str, asyncio.Future] = {}
+        for name, (fn, after) in self._steps.items():
+            tasks[name] = asyncio.ensure_future(self._run_step(name, fn, after, [tasks[d] for d in after], origin, on_step))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            # Collect what the other steps raised, so nothing is reported as never retrieved
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return {name: task.result() for name, task in tasks.items()}
+
+    async def _run_step(self, name: str, fn, after: Tuple[str, ...], dependencies: List[asyncio.Future], origin: float,
+                        on_step=None):
+        results = [await dependency for dependency in dependencies]
+        self.started[name] = time.perf_counter() - origin
+        try:
+            result = await fn(**dict(zip(after, results)))
+        finally:
+            self.finished[name] = time.perf_counter() - origin
+        if on_step:
+            on_step(name, result)
+        return result
+
+    def critical_path(self) -> List[Tuple[str, float]]:
+        """(step, seconds) along the chain of steps that determined the total latency, first step first."""
+        if not self.finished:
+            return []
+        step = max(self.finished, key=self.finished.get)
+        path = []
+        while step is not None:
+            path.append((step, self.finished[step] - self.started[step]))
+            after = [dependency for dependency in self._steps[step][1] if dependency in self.finished]
+            step = max(after, key=self.finished.get) if after else None
+        return path[::-1]
+
+    def timings(self) -> dict:
+        """Start and end of every step that ran, in seconds from the start of the run, and the critical path."""
+        return {
+            "steps": {name: {"start": self.started[name], "end": self.finished[name]}
+                      for name in self.finished},
+            "critical_path": [name for name, _ in self.critical_path()],
+            "total_seconds": max(self.finished.values(), default=0.0),
+        }
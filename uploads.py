@@ -0,0 +1,108 @@
+"""
+Upload ingestion for the analysis.
+
+Starlette has already parsed the multipart body into SpooledTemporaryFiles,
+which stay in memory up to its own spool limit (1 MB) and roll over to disk
+beyond it. Each upload is streamed from there in chunks and hashed on the
+way. The copy the analysis reads is kept in memory; only a file larger than
+config.UPLOAD_SPOOL_BYTES is copied to a named temp file instead, so the
+parsers can open it by path. That file is removed as soon as the request is
+done. Per-file and per-request size limits are enforced while streaming, so
+an oversized upload is rejected with a 413 before it is copied in full.
+"""
+import hashlib
+import io
+import os
+import tempfile
+from typing import Optional
+
+from fastapi import HTTPException
+
+import config
+
+CHUNK_SIZE = 64 * 1024
+
+
+class RequestBudget:
+    """Bytes a single request may still upload across all of its files."""
+
+    def __init__(self, max_bytes: int = config.MAX_REQUEST_SIZE):
+        self.max_bytes = max_bytes
+        self.remaining = max_bytes
+
+    def consume(self, n: int):
+        self.remaining -= n
+        if self.remaining < 0:
+            raise HTTPException(status_code=413, detail=f"Uploads exceed the per-request limit of {self.max_bytes} bytes")
+
+
+class Upload:
+    def __init__(self, filename: str, digest: str, size: int, data: Optional[bytes] = None, path: Optional[str] = None):
+        self.filename = filename
+        self.digest = digest
+        self.size = size
+        self.data = data
+        self.path = path
+
+    @property
+    def source(self):
+        """The upload as the parsers take it: bytes when in memory, else the spill file path."""
+        return self.data if self.data is not None else self.path
+
+    def open(self):
+        return io.BytesIO(self.data) if self.data is not None else open(self.path, "rb")
+
+    def close(self):
+        self.data = None
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                print(f"Failed to delete spilled upload {self.path}: {e}")
+            self.path = None
+
+
+async def read_upload(file, budget: RequestBudget, max_file_bytes: int = config.MAX_UPLOAD_SIZE,
+                      spool_bytes: int = config.UPLOAD_SPOOL_BYTES) -> Upload:
+    """
+    Streams an UploadFile in, hashing it (SHA-256) and enforcing the size limits.
+
+    Raises:
+        HTTPException: 413 as soon as the file or the request goes over its limit.
+    """
+    declared = getattr(file, "size", None)
+    if declared is not None and declared > min(max_file_bytes, budget.remaining):
+        raise HTTPException(status_code=413, detail=f"{file.filename} is larger than the upload limit")
+
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    spill = None
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_file_bytes:
+                raise HTTPException(status_code=413, detail=f"{file.filename} exceeds the per-file limit of {max_file_bytes} bytes")
+            budget.consume(len(chunk))
+            digest.update(chunk)
+            if spill is None and size > spool_bytes:
+                spill = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename or "")[1])
+                spill.write(buffer)
+                buffer = None
+            if spill is not None:
+                spill.write(chunk)
+            else:
+                buffer += chunk
+    except BaseException:
+        if spill is not None:
+            spill.close()
+            os.remove(spill.name)
+        raise
+
+    if spill is not None:
+        spill.close()
+        return Upload(file.filename, digest.hexdigest(), size, path=spill.name)
+    return Upload(file.filename, digest.hexdigest(), size, data=bytes(buffer))
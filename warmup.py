@@ -0,0 +1,84 @@
+"""
+Startup warm-up and readiness.
+
+Heavy dependencies (smolagents/LiteLLM, spaCy, PyMuPDF, docx2python) are not
+imported when the API module loads; they are loaded on first use or by the
+warm-up steps, which the API runs on a background thread at startup. The
+process can therefore answer health checks at once, and GET /ready reports
+503 until the critical steps (agents, interaction DB) are done. The other
+steps only save first-request latency: they load lazily on first use anyway,
+so a slow or failed one is reported in status() but does not hold up traffic.
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import config
+
+# Warm-up steps without which no analysis can succeed
+CRITICAL_STEPS = ("agents", "interaction_db")
+
+
+class Readiness:
+    def __init__(self, budget: float = config.STARTUP_BUDGET_SECONDS, critical=CRITICAL_STEPS):
+        self.budget = budget
+        self.critical = tuple(critical)
+        self.started_at = time.time()
+        self.import_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.components: Dict[str, dict] = {}
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """Whether every critical step has succeeded; the other steps may still be running or have failed."""
+        with self._lock:
+            components = self.components
+            return bool(components) and all(components[name]["ready"] for name in self.critical if name in components)
+
+    def run(self, steps: Dict[str, Callable[[], object]]):
+        """Runs the warm-up steps in order; a failing step is reported and the rest still run."""
+        start = time.perf_counter()
+        with self._lock:
+            self.components = {name: {"ready": False} for name in steps}
+        for name, step in steps.items():
+            step_start = time.perf_counter()
+            try:
+                step()
+                state = {"ready": True}
+            except Exception as e:
+                print(f"Warm-up step {name} failed: {e}")
+                state = {"ready": False, "error": str(e)}
+            state["seconds"] = round(time.perf_counter() - step_start, 3)
+            with self._lock:
+                self.components[name] = state
+        self.warmup_seconds = time.perf_counter() - start
+        self._done.set()
+        total = (self.import_seconds or 0.0) + self.warmup_seconds
+        if total > self.budget:
+            print(f"Startup took {total:.1f} s, over the {self.budget:.1f} s budget")
+
+    def start(self, steps: Dict[str, Callable[[], object]]) -> threading.Thread:
+        thread = threading.Thread(target=self.run, args=(steps,), name="warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> dict:
+        with self._lock:
+            components = {name: dict(state) for name, state in self.components.items()}
+        total = None if self.warmup_seconds is None else (self.import_seconds or 0.0) + self.warmup_seconds
+        return {
+            "ready": self.ready,
+            "warmup_done": self._done.is_set(),
+            "critical": [name for name in self.critical if name in components],
+            "components": components,
+            "import_seconds": self.import_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "startup_seconds": total,
+            "budget_seconds": self.budget,
+            "within_budget": None if total is None else total <= self.budget,
+        }
+
+
+readiness = Readiness()